@@ -0,0 +1,58 @@
+"""
+Measures how many chat commands per second go through
+Bot.process_commands, from the message content to the command's
+coroutine being awaited, for a few typical command signatures. Like the
+package, it needs Python 3.7.
+
+Usage: python benchmarks/commands_benchmark.py
+"""
+import asyncio
+import time
+
+from twitch import Message
+from twitch.plugins.commands import Bot
+
+COUNT = 50000
+
+CONTENTS = {
+    'no parameters': '!ping',
+    'converted parameters': '!add 12 30',
+    'keyword parameters': '!greet ronni "good evening"',
+    'unknown command': '!nope 1 2 3',
+}
+
+
+def create_bot(loop):
+    bot = Bot(loop=loop)
+
+    @bot.command()
+    async def ping(ctx):
+        pass
+
+    @bot.command()
+    async def add(ctx, a: int, b: int):
+        pass
+
+    @bot.command()
+    async def greet(ctx, *, name: str, greeting: str):
+        pass
+
+    return bot
+
+
+async def bench(bot, content):
+    message = Message(content, None, None, session=bot, tags_data=None)
+    start = time.perf_counter()
+    for _ in range(COUNT):
+        await bot.process_commands(message, _ctor=True)
+    return COUNT / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    loop = asyncio.new_event_loop()
+    bot = create_bot(loop)
+    for label, content in CONTENTS.items():
+        rate = max(loop.run_until_complete(bench(bot, content))
+                   for _ in range(3))
+        print(f'{label + ":":24}{rate:>12,.0f} commands/s')
+    loop.close()
@@ -0,0 +1,98 @@
+"""
+Measures how many bytes a retained Message takes, with its author, badges,
+color and emotes. The slotted models, which share their badges and colors,
+are compared against copies of them that keep a per-instance __dict__ and
+build a new badge list and Color for every message, like the models did
+before.
+
+Usage: python benchmarks/memory_benchmark.py
+"""
+import gc
+import tracemalloc
+from contextlib import contextmanager
+
+from twitch import message, user
+from twitch.channel import Channel
+
+COUNT = 100000
+
+TAGS = {
+    'badge-info': 'subscriber/8',
+    'badges': 'subscriber/6,premium/1',
+    'color': '#1E90FF',
+    'display-name': 'Ronni',
+    'emotes': '25:0-4,12-16/1902:6-10',
+    'id': 'b34ccfc7-4977-403a-8a94-33c6bac34fb8',
+    'mod': '0',
+    'tmi-sent-ts': '1507246572675',
+    'user-id': '1337',
+}
+CONTENT = 'Kappa Keepo Kappa'
+
+MODELS = [(message, 'Message'), (user, 'User'), (user, 'Badge'),
+          (user, 'Color'), (message, 'Emote')]
+
+
+def _badges_from_tags(cls, badges, info):
+    return [cls(badge, info) for badge in badges.split(',') if badge]
+
+
+def _color_from_tag(cls, hex_rgb):
+    return cls(hex_rgb)
+
+
+# the baseline builds its own objects, it must not reuse the instances
+# interned by the slotted models
+NOT_INTERNED = {
+    'Badge': {'from_tags': classmethod(_badges_from_tags)},
+    'Color': {'from_tag': classmethod(_color_from_tag)},
+}
+
+
+def without_slots(cls):
+    """
+    Returns a copy of ``cls`` storing its attributes in a ``__dict__``,
+    and not sharing instances.
+    """
+    slots = cls.__dict__.get('__slots__', ())
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in slots and key != '__slots__'}
+    namespace.update(NOT_INTERNED.get(cls.__name__, {}))
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+@contextmanager
+def dict_models():
+    saved = [(module, name, getattr(module, name))
+             for module, name in MODELS]
+    for module, name, cls in saved:
+        setattr(module, name, without_slots(cls))
+    try:
+        yield
+    finally:
+        for module, name, cls in saved:
+            setattr(module, name, cls)
+
+
+def bytes_per_message():
+    channel = Channel('dallas', session=None, tags_data=None)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    retained = []
+    for i in range(COUNT):
+        author = user.User.from_tags(f'ronni{i}', TAGS, session=None)
+        retained.append(message.Message(CONTENT, author, channel,
+                                        session=None, tags_data=TAGS))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / COUNT
+
+
+if __name__ == '__main__':
+    with dict_models():
+        legacy = bytes_per_message()
+    slotted = bytes_per_message()
+    print(f'__dict__ models, not shared: {legacy:,.0f} bytes/message')
+    print(f'__slots__ models, shared:    {slotted:,.0f} bytes/message')
+    print(f'saved:                       {1 - slotted / legacy:.0%}')
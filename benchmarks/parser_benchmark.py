@@ -0,0 +1,88 @@
+"""
+Compares how many lines per second the IRC tokenizer splits against the
+substring based opcode detection the parser used before it. Like most
+handlers, three tags are read from every line that has tags.
+
+Usage: python benchmarks/parser_benchmark.py
+"""
+import timeit
+
+from twitch.irc import tokenize
+from twitch.opcodes import OpCode
+from twitch.parser import SingleLineMessageParser
+
+LINES = [
+    '@badge-info=subscriber/8;badges=subscriber/6,premium/1;color=#1E90FF;'
+    'display-name=Ronni;emotes=25:0-4,12-16/1902:6-10;flags=;id=b34ccfc7-'
+    '4977-403a-8a94-33c6bac34fb8;mod=0;room-id=1337;subscriber=1;'
+    'tmi-sent-ts=1507246572675;turbo=1;user-id=1337;user-type= '
+    ':ronni!ronni@ronni.tmi.twitch.tv PRIVMSG #dallas :Kappa Keepo Kappa',
+    ':ronni!ronni@ronni.tmi.twitch.tv JOIN #dallas',
+    '@emote-only=0;followers-only=0;r9k=0;slow=0;subs-only=0 '
+    ':tmi.twitch.tv ROOMSTATE #dallas',
+    'PING :tmi.twitch.tv',
+]
+
+
+def legacy_parse(msg):
+    have_tags = msg.startswith('@')
+    tags_dict = None
+    if have_tags:
+        tags_msg = msg.lstrip('@').split(' ', 1)[0]
+        tag_parts = [tag_part.split('=') for tag_part in
+                     list(filter(None, tags_msg.split(';')))]
+        tags_dict = {kv[0]: kv[1] for kv in tag_parts if len(kv) == 2}
+    non_tags_msg = msg.split(' ', 1)
+    msg = ' '.join(non_tags_msg) if not have_tags else non_tags_msg[1]
+
+    if OpCode.PING in msg or OpCode.NOTICE in msg or OpCode.MODE in msg \
+            or ':tmi.twitch.tv CAP * ACK' in msg \
+            or OpCode.GLOBALUSERSTATE in msg:
+        return tags_dict, msg
+
+    msg_parts = list(filter(None, msg.split(' ')))
+    msg_dict = {}
+    if len(msg_parts) > 2:
+        username = None
+        if msg_parts[0].endswith('.tmi.twitch.tv'):
+            user_parts = msg_parts[0][:-len('.tmi.twitch.tv')].split('@')
+            if len(user_parts) == 2:
+                username = user_parts[1]
+        msg_dict['username'] = username
+        msg_dict['opcode'] = msg_parts[1]
+        msg_dict['channel_name'] = msg_parts[2].lstrip('#')
+    if len(msg_parts) > 3:
+        msg_dict['args'] = msg_parts[3:]
+        ' '.join(msg_dict['args']).lstrip(':')
+    return tags_dict, msg_dict
+
+
+def tokenizer_parse(msg):
+    line = tokenize(msg)
+    if line.tags:
+        line.tags.get('display-name')
+        line.tags.get('user-id')
+        line.tags.get('color')
+    return line, SingleLineMessageParser._HANDLERS.get(line.command)
+
+
+def bench(funcs, number, rounds=15):
+    """
+    Returns the lines/s of each function. The functions take turns, round
+    after round, and the best round of each is kept, so a noisy machine
+    slows them all down alike rather than whichever ran during the noise.
+    """
+    best = [float('inf')] * len(funcs)
+    for _ in range(rounds):
+        for i, func in enumerate(funcs):
+            seconds = timeit.timeit(lambda: [func(line) for line in LINES],
+                                    number=number)
+            best[i] = min(best[i], seconds)
+    return [number * len(LINES) / seconds for seconds in best]
+
+
+if __name__ == '__main__':
+    legacy, tokenizer = bench([legacy_parse, tokenizer_parse], 5000)
+    print(f'legacy parser:  {legacy:,.0f} lines/s')
+    print(f'tokenizer:      {tokenizer:,.0f} lines/s')
+    print(f'speedup:        {tokenizer / legacy:.2f}x')
@@ -8,12 +8,22 @@ __version__ = '0.1.0'
 
 __all__ = [
     'Client',
+    'UserCache',
+    'Overflow',
+    'Metrics', 'Stage',
+    'Shard', 'ShardedRunner', 'TwitchBackoff',
     'CapabilityConfig',
     'User', 'Message',
     'Channel',
     'Event']
 
 from .client import Client
+from .cache import UserCache
+from .backpressure import Overflow
+from .metrics import Metrics, Stage
+from .shard import Shard
+from .runner import ShardedRunner
+from .websocket import TwitchBackoff
 from .capability import CapabilityConfig
 from .user import User
 from .message import Message
@@ -0,0 +1,89 @@
+import asyncio
+import enum
+
+
+class Overflow(enum.Enum):
+    """
+    What a bounded queue does with a new item once it is full
+    """
+    BLOCK = 0  #: wait until there is room in the queue
+    DROP_OLDEST = 1  #: drop the oldest queued item to make room
+    DROP_NEWEST = 2  #: drop the new item
+
+
+class BoundedQueue:
+    """
+    An :class:`asyncio.Queue` with a selectable :class:`Overflow` policy,
+    that keeps track of how deep it got, how many items were dropped and
+    how long items waited in it (the lag).
+    """
+    def __init__(self, maxsize, overflow=Overflow.BLOCK, *, loop):
+        self.loop = loop
+        self.overflow = overflow
+        self._queue = asyncio.Queue(maxsize=maxsize, loop=loop)
+        self._dropped = 0
+        self._max_depth = 0
+        self._lag = 0.0
+        self._max_lag = 0.0
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    @property
+    def lag(self):
+        """
+        How long the last item returned by :meth:`get` waited in the queue
+        """
+        return self._lag
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def metrics(self):
+        return {'depth': self.depth, 'max_depth': self._max_depth,
+                'dropped': self._dropped, 'lag': self._lag,
+                'max_lag': self._max_lag}
+
+    async def put(self, item):
+        """
+        Queues the item, applying the overflow policy if the queue is full.
+        Returns ``False`` if the item was dropped.
+        """
+        queue = self._queue
+        if queue.full():
+            if self.overflow == Overflow.DROP_NEWEST:
+                self._dropped += 1
+                return False
+            elif self.overflow == Overflow.DROP_OLDEST:
+                queue.get_nowait()
+                self._dropped += 1
+
+        await queue.put((self.loop.time(), item))
+        self._max_depth = max(self._max_depth, queue.qsize())
+        return True
+
+    def put_nowait(self, item):
+        """
+        Same as :meth:`put`, without waiting. With :attr:`Overflow.BLOCK`,
+        raises :exc:`asyncio.QueueFull` if the queue is full.
+        """
+        queue = self._queue
+        if queue.full():
+            if self.overflow == Overflow.DROP_NEWEST:
+                self._dropped += 1
+                return False
+            elif self.overflow == Overflow.DROP_OLDEST:
+                queue.get_nowait()
+                self._dropped += 1
+
+        queue.put_nowait((self.loop.time(), item))
+        self._max_depth = max(self._max_depth, queue.qsize())
+        return True
+
+    async def get(self):
+        queued_at, item = await self._queue.get()
+        self._lag = self.loop.time() - queued_at
+        self._max_lag = max(self._max_lag, self._lag)
+        return item
@@ -0,0 +1,219 @@
+import time
+from collections import OrderedDict
+from multiprocessing.managers import SyncManager
+
+_MISSING = object()
+
+
+class UserCache:
+    """
+    A size bounded LRU cache of :class:`User` objects, with a per-entry
+    time to live. Users are reachable by both their id and login.
+
+    Logins that Twitch reports as not existing are cached as well
+    (negative caching), so they don't keep hitting the Helix API.
+
+    Parameters
+    -----------
+
+    max_size: Optional[:class:`int`]
+        The maximum amount of users kept in the cache. Once full, the least
+        recently used user is evicted. Defaults to ``1000``
+    ttl: Optional[:class:`float`]
+        The amount of seconds a user is kept before it must be requested
+        again. Defaults to ``300``
+    missing_ttl: Optional[:class:`float`]
+        The amount of seconds a login that doesn't exist is remembered for.
+        Defaults to ``60``
+    """
+    def __init__(self, max_size=1000, ttl=300.0, missing_ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        # login -> (user or _MISSING, expires_at)
+        self._entries = OrderedDict()
+        # user id -> login
+        self._ids = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hits(self):
+        """
+        The number of lookups answered by the cache
+
+        :type: :class:`int`
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        The number of lookups that had to go to the Helix API
+
+        :type: :class:`int`
+        """
+        return self._misses
+
+    @property
+    def evictions(self):
+        """
+        The number of users dropped because the cache was full
+
+        :type: :class:`int`
+        """
+        return self._evictions
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self._hits,
+                'misses': self._misses, 'evictions': self._evictions}
+
+    def get(self, *, user_id=None, login=None):
+        """
+        Looks up a user by id or login.
+
+        Returns a ``(found, user)`` tuple. ``found`` is false when the
+        API has to be asked; when it is true, ``user`` may still be ``None``
+        if the login is known to not exist.
+        """
+        key = self._ids.get(int(user_id)) if user_id else None
+        if key is None and login:
+            key = login.lower()
+
+        entry = self._entries.get(key) if key is not None else None
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, None if user is _MISSING else user
+            self._remove(key)
+
+        self._misses += 1
+        return False, None
+
+    def put(self, user):
+        login = user.login.lower()
+        self._remove(login)
+        self._entries[login] = (user, time.monotonic() + self.ttl)
+        if user.id is not None:
+            self._ids[user.id] = login
+        self._evict()
+
+    def put_missing(self, login):
+        login = login.lower()
+        self._remove(login)
+        self._entries[login] = (_MISSING, time.monotonic() + self.missing_ttl)
+        self._evict()
+
+    def invalidate(self, *, user_id=None, login=None):
+        key = self._ids.get(int(user_id)) if user_id else None
+        if key is None and login:
+            key = login.lower()
+        if key is not None:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._ids.clear()
+
+    def _remove(self, login):
+        entry = self._entries.pop(login, None)
+        if entry is not None:
+            user, _ = entry
+            if user is not _MISSING and user.id is not None:
+                self._ids.pop(user.id, None)
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            _, (user, _) = self._entries.popitem(last=False)
+            if user is not _MISSING and user.id is not None:
+                self._ids.pop(user.id, None)
+            self._evictions += 1
+
+
+class SharedUserStore:
+    """
+    Helix user payloads shared between processes, on top of each
+    process' own :class:`UserCache`.
+
+    ``mapping`` is any mapping every process can reach, typically a
+    :class:`SharedUserMapping` served by a :class:`SharedUsersManager`,
+    which answers a whole batch of keys in one round trip. Entries expire
+    using the wall clock, as monotonic clocks aren't comparable across
+    processes.
+
+    Both methods block on the manager process, so the client runs them in
+    an executor.
+    """
+    def __init__(self, mapping, ttl=300.0):
+        self._mapping = mapping
+        self.ttl = ttl
+
+    def get_many(self, *, user_ids=None, logins=None):
+        """
+        Returns the payloads found, then the user ids and logins that
+        weren't.
+        """
+        keys = [f'id:{int(user_id)}' for user_id in user_ids or []]
+        keys += [f'login:{login.lower()}' for login in logins or []]
+        if not keys:
+            return [], [], []
+
+        get_many = getattr(self._mapping, 'get_many', None)
+        if get_many is not None:
+            entries = get_many(keys)
+        else:
+            entries = [self._mapping.get(key) for key in keys]
+
+        now = time.time()
+        found = {}
+        missing_ids = []
+        missing_logins = []
+        for key, entry, user_id_or_login in zip(
+                keys, entries, list(user_ids or []) + list(logins or [])):
+            if entry is not None and entry[1] > now:
+                data = entry[0]
+                found[data['id']] = data
+            elif key.startswith('id:'):
+                missing_ids.append(user_id_or_login)
+            else:
+                missing_logins.append(user_id_or_login)
+        return list(found.values()), missing_ids, missing_logins
+
+    def put_many(self, payloads):
+        expires_at = time.time() + self.ttl
+        entries = {}
+        for data in payloads:
+            entry = (data, expires_at)
+            entries[f'id:{int(data["id"])}'] = entry
+            entries[f'login:{data["login"].lower()}'] = entry
+        if entries:
+            # a single round trip to the manager process
+            self._mapping.update(entries)
+
+
+class SharedUserMapping(dict):
+    """
+    The dict behind a :class:`SharedUserStore`, living in the manager
+    process. :meth:`get_many` looks up a batch of keys in a single call.
+    """
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+
+class SharedUsersManager(SyncManager):
+    """
+    A :class:`multiprocessing.managers.SyncManager` that also serves
+    :class:`SharedUserMapping` objects, through ``manager.SharedUsers()``.
+    """
+
+
+SharedUsersManager.register(
+    'SharedUsers', SharedUserMapping,
+    exposed=('get', 'get_many', 'update', '__len__', '__getitem__',
+             '__contains__'))
@@ -10,6 +10,10 @@ class Channel:
         ALL = 1
         LIMITED = 2
 
+    __slots__ = ('_name', '_session', '_id', '_emote_only', '_followers_only',
+                 '_followers_only_limit', '_r9k', '_slow_duration',
+                 '_sub_only')
+
     def __init__(self, channel_name, *, session, tags_data):
         self._name = channel_name
         self._session = session
@@ -22,43 +26,58 @@ class Channel:
         self._slow_duration = None
         self._sub_only = None
 
-        if tags_data:
-            room_id = tags_data.get(Tags.ROOM_ID)
-            if room_id:
-                self._id = int(room_id)
-
-            emote_only = tags_data.get(Tags.EMOTE_ONLY)
-            if emote_only:
-                self._emote_only = int(emote_only) == 1
-
-            followers_only = tags_data.get(Tags.FOLLOWERS_ONLY)
-            if followers_only:
-                followers_only = int(followers_only)
-                if followers_only > 0:
-                    self._followers_only = Channel.FollowersOnly.LIMITED
-                elif followers_only == 0:
-                    self._followers_only = Channel.FollowersOnly.ALL
-                else:
-                    self._followers_only = Channel.FollowersOnly.DISABLED
-
-                if self._followers_only == Channel.FollowersOnly.LIMITED:
-                    self._followers_only_limit = timedelta(
-                        minutes=followers_only)
-
-            r9k = tags_data.get(Tags.R9K)
-            if r9k:
-                r9k = int(r9k)
-                self._r9k = r9k == 1
-
-            slow = tags_data.get(Tags.SLOW)
-            if slow:
-                slow = int(slow)
-                self._slow_duration = timedelta(seconds=slow)
-
-            sub_only = tags_data.get(Tags.SUBS_ONLY)
-            if sub_only:
-                sub_only = int(sub_only)
-                self._sub_only = sub_only == 1
+        self._update_tags(tags_data)
+
+    def __repr__(self):
+        return f'<Channel name={self._name!r} id={self._id}>'
+
+    def _update_tags(self, tags_data):
+        """
+        Applies the room settings found in ``tags_data``. Settings missing
+        from the tags are left untouched, as Twitch only sends the ones that
+        changed in a ROOMSTATE after the initial one.
+        """
+        if not tags_data:
+            return
+
+        room_id = tags_data.get(Tags.ROOM_ID)
+        if room_id:
+            self._id = int(room_id)
+
+        emote_only = tags_data.get(Tags.EMOTE_ONLY)
+        if emote_only:
+            self._emote_only = int(emote_only) == 1
+
+        followers_only = tags_data.get(Tags.FOLLOWERS_ONLY)
+        if followers_only:
+            followers_only = int(followers_only)
+            if followers_only > 0:
+                self._followers_only = Channel.FollowersOnly.LIMITED
+            elif followers_only == 0:
+                self._followers_only = Channel.FollowersOnly.ALL
+            else:
+                self._followers_only = Channel.FollowersOnly.DISABLED
+
+            if self._followers_only == Channel.FollowersOnly.LIMITED:
+                self._followers_only_limit = timedelta(
+                    minutes=followers_only)
+            else:
+                self._followers_only_limit = None
+
+        r9k = tags_data.get(Tags.R9K)
+        if r9k:
+            r9k = int(r9k)
+            self._r9k = r9k == 1
+
+        slow = tags_data.get(Tags.SLOW)
+        if slow:
+            slow = int(slow)
+            self._slow_duration = timedelta(seconds=slow)
+
+        sub_only = tags_data.get(Tags.SUBS_ONLY)
+        if sub_only:
+            sub_only = int(sub_only)
+            self._sub_only = sub_only == 1
 
     @property
     def name(self):
@@ -1,16 +1,21 @@
 import asyncio
+import copy
 import logging
 import signal
-import aiohttp
-import websockets
+from functools import partial
 
 from .capability import CapabilityConfig
-from .events import Event
 from .event_handler import EventHandler
-from .http import HTTPClient, HTTPException
-from .websocket import WebSocketClient, TwitchBackoff
-from .exception import WebSocketConnectionClosed, WebSocketLoginFailure
+from .http import HTTPClient
+from .scheduler import SendLimits
+from .backpressure import Overflow
+from .shard import Shard, HashRing
+from .websocket import TwitchBackoff
 from .user import User
+from .channel import Channel
+from .cache import UserCache, SharedUserStore
+from .loader import UserLoader
+from .metrics import Metrics
 
 log = logging.getLogger(__name__)
 
@@ -33,36 +38,182 @@ class Client:
             default event loop is used via :func:`asyncio.get_event_loop()`.
         connector: :class:`aiohttp.BaseConnector`
             The connector to use for connection pooling.
+        partial_users: Optional[:class:`bool`]
+            If true, users attached to chat events are built from the IRC
+            tags instead of requesting them from the Helix API for every
+            message. See :attr:`User.is_partial`. Defaults to ``False``
+        user_cache_size: Optional[:class:`int`]
+            The maximum amount of users kept in :attr:`user_cache`.
+            Defaults to ``1000``
+        user_cache_ttl: Optional[:class:`float`]
+            The amount of seconds a cached user is considered fresh.
+            Defaults to ``300``
+        user_batch_window: Optional[:class:`float`]
+            The amount of seconds :meth:`get_user` waits for other lookups
+            to batch into the same request. Defaults to ``0.005``
+        http_concurrency: Optional[:class:`int`]
+            The maximum amount of requests a chunked Helix call, such as
+            :meth:`get_users`, may have in flight at once. Defaults to ``4``
+        ingress_queue_size: Optional[:class:`int`]
+            The maximum amount of received messages waiting to be parsed.
+            Defaults to ``1000``
+        ingress_overflow: Optional[:class:`Overflow`]
+            What to do with received messages once the ingress queue is
+            full. Defaults to ``Overflow.BLOCK``, which stops reading from
+            the websocket until there is room
+        ingress_workers: Optional[:class:`int`]
+            The amount of tasks parsing and dispatching received messages.
+            With more than one, messages may be dispatched out of order.
+            Defaults to ``1``
+        metrics: Optional[:class:`bool`]
+            If true, the time spent in every stage of handling a message is
+            recorded in :attr:`metrics`. Defaults to ``False``
+        shard_count: Optional[:class:`int`]
+            The amount of websocket connections opened on :meth:`connect`.
+            Channels are spread over them with consistent hashing.
+            Defaults to ``1``
+        max_channels_per_shard: Optional[:class:`int`]
+            The maximum amount of channels joined through one connection.
+            Once every shard is full, another connection is opened.
+            Defaults to ``None``, no limit
+        backoff: Optional[:class:`TwitchBackoff`]
+            The backoff deciding how long to wait before reconnecting. It
+            is shared by every shard, and can be shared between clients of
+            the same process. Defaults to ``TwitchBackoff()``
+        heartbeat_interval: Optional[:class:`float`]
+            The amount of seconds between the PINGs every connection sends
+            to measure :attr:`latency` and detect dead connections.
+            ``None`` disables them. Defaults to ``30``
+        heartbeat_timeout: Optional[:class:`float`]
+            The amount of seconds to wait for the answer to a PING before
+            the connection is considered dead and reconnected.
+            Defaults to ``10``
+        shared_users: Optional[MutableMapping]
+            A mapping shared with other processes, where users requested
+            from the Helix API are stored for all of them. Use
+            ``SharedUsersManager().SharedUsers()`` from ``twitch.cache``,
+            which answers a batch of lookups in one round trip. Defaults
+            to ``None``
+        rate_limit_share: Optional[:class:`float`]
+            The fraction of the Helix and chat rate limits this client may
+            use, when other processes use the same credentials.
+            Defaults to ``1.0``
 
         Attributes
         -----------
         ws
-            The websocket gateway the client is currently connected to.
-            Could be ``None``.
+            The websocket gateway of the primary shard. Could be ``None``.
+        shards: Dict[:class:`int`, :class:`Shard`]
+            The websocket connections of the client, by shard id.
+        backoff: :class:`TwitchBackoff`
+            The reconnect backoff shared by the shards.
         loop: :class:`asyncio.AbstractEventLoop`
             The event loop that the client uses for HTTP requests and
             websocket operations.
+        user_cache: :class:`UserCache`
+            The cache shared by :meth:`get_user` and :meth:`get_users`.
+        ingress: :class:`BoundedQueue`
+            The queue of received messages waiting to be parsed for the
+            primary shard. Its ``metrics()`` report the queue depth,
+            dropped messages and lag. Could be ``None``.
+        channels: Dict[:class:`str`, :class:`Channel`]
+            The channels the client has joined, by name. Every event about a
+            channel is passed the same :class:`Channel`, kept up to date
+            with the room settings Twitch sends.
+        metrics: :class:`Metrics`
+            The per-stage latency histograms of the client. Read them with
+            ``metrics.snapshot()`` or ``metrics.to_prometheus()``.
         """
     def __init__(self, *, capability=CapabilityConfig(), loop=None, **kwargs):
-        self.ws = None
         self.username = None
         self.capability = capability
         self.loop = loop if loop else asyncio.get_event_loop()
-        self.event_handler = EventHandler(self.loop)
+        self.metrics = Metrics(enabled=kwargs.pop('metrics', False))
+        self.event_handler = EventHandler(self.loop, metrics=self.metrics)
+
+        self.partial_users = kwargs.pop('partial_users', False)
+        # shared by every websocket connection so the chat limits
+        # survive reconnects
+        rate_limit_share = kwargs.pop('rate_limit_share', 1.0)
+        self._send_limits = SendLimits(share=rate_limit_share)
+        self.user_cache = UserCache(
+            max_size=kwargs.pop('user_cache_size', 1000),
+            ttl=kwargs.pop('user_cache_ttl', 300.0))
+        shared_users = kwargs.pop('shared_users', None)
+        self._shared_users = SharedUserStore(
+            shared_users, ttl=self.user_cache.ttl) \
+            if shared_users is not None else None
+        self._user_loader = UserLoader(
+            self._load_users, loop=self.loop,
+            window=kwargs.pop('user_batch_window', 0.005))
 
         connector = kwargs.pop('connector', None)
-        self.http = HTTPClient(connector=connector, loop=self.loop)
+        self.http = HTTPClient(
+            connector=connector, loop=self.loop,
+            max_concurrency=kwargs.pop('http_concurrency', 4),
+            metrics=self.metrics, rate_limit_share=rate_limit_share)
+        self.channels = {}
+        self.shards = {}
+        # channel name -> shard id
+        self._assignments = {}
+        # channel name -> future resolved when Twitch confirms the join/part
+        self._pending_joins = {}
+        self._pending_parts = {}
+        self._ring = HashRing(replicas=kwargs.pop('shard_replicas', 100))
+        self._shard_count = max(kwargs.pop('shard_count', 1), 1)
+        self._max_channels_per_shard = kwargs.pop('max_channels_per_shard',
+                                                  None)
+        self._reconnect = True
+        self._stopped = None
+        self.backoff = kwargs.pop('backoff', None) or TwitchBackoff()
+        self._heartbeat_interval = kwargs.pop('heartbeat_interval', 30.0)
+        self._heartbeat_timeout = kwargs.pop('heartbeat_timeout', 10.0)
+        self._ingress_queue_size = kwargs.pop('ingress_queue_size', 1000)
+        self._ingress_overflow = kwargs.pop('ingress_overflow',
+                                            Overflow.BLOCK)
+        self._ingress_workers = kwargs.pop('ingress_workers', 1)
         self._closed = False
 
     # ================ #
     # event management #
     # ================ #
 
-    def event(self, name):
+    def event(self, name, *, concurrency=None, queue_size=None,
+              overflow=Overflow.DROP_OLDEST, serial_per_channel=False):
         """A decorator that registers an event to listen to.
                 You can find more info about the events_ here.
-                The events must be a ``coroutine``, if not,
-                :exc:`TypeError` is raised.
+                The events should be a ``coroutine``, which is run in its
+                own task. A plain function is also accepted and is called
+                inline as soon as the event is dispatched, so it must not
+                block. Anything else raises :exc:`TypeError`.
+
+                By default every event starts a new task, however many are
+                still running. Passing any of the options below runs the
+                coroutine in ``concurrency`` worker tasks instead, fed by a
+                bounded queue. Their queue depth and dropped events are
+                reported by ``client.event_handler.metrics()``.
+
+                Parameters
+                -----------
+
+                name: :class:`str`
+                    The name of the event
+                concurrency: Optional[:class:`int`]
+                    The maximum amount of events handled at once by the
+                    coroutine. Defaults to ``1`` when another option is set
+                queue_size: Optional[:class:`int`]
+                    The maximum amount of events waiting to be handled.
+                    Defaults to ``1000`` when another option is set
+                overflow: Optional[:class:`Overflow`]
+                    What to do with new events once the queue is full.
+                    ``Overflow.BLOCK`` stops the client from reading new
+                    messages until there is room. Defaults to
+                    ``Overflow.DROP_OLDEST``
+                serial_per_channel: Optional[:class:`bool`]
+                    If true, the events of a channel are handled one at a
+                    time, in the order they were received. Events of
+                    different channels still run concurrently. Defaults to
+                    ``False``
 
                 Example
                 ---------
@@ -72,10 +223,15 @@ class Client:
                     @client.event(twitch.Event.CONNECTED)
                     async def on_connected(user):
                         print(f'{user.login} connected!')
+
+                    @client.event(twitch.Event.MESSAGE, concurrency=8,
+                                  serial_per_channel=True)
+                    async def on_message(message):
+                        await save(message)
                 Raises
                 --------
                 TypeError
-                    The coroutine passed is not actually a coroutine.
+                    The listener passed is not callable.
 
                 ValueError
                     The coroutine's name can't start with an
@@ -83,10 +239,9 @@ class Client:
                 """
         def decorator(client):
             def wrapper(coro):
-                if not asyncio.iscoroutinefunction(coro):
+                if not callable(coro):
                     raise TypeError(
-                        f'{coro.__name__} '
-                        f'must be a coroutine function to be registered')
+                        f'{coro!r} must be callable to be registered')
 
                 real_name = name if name else coro.__name__
                 alias = f' (with the alias ' \
@@ -97,7 +252,10 @@ class Client:
                         f'event names cannot start with an underscore, '
                         f'those are reserverd for the library: {real_name}')
 
-                client.event_handler.register(real_name, coro)
+                client.event_handler.register(
+                    real_name, coro, concurrency=concurrency,
+                    queue_size=queue_size, overflow=overflow,
+                    serial_per_channel=serial_per_channel)
                 log.debug(
                     f'{real_name}{alias} '
                     f'has successfully been registered as an event')
@@ -105,7 +263,8 @@ class Client:
             return wrapper
         return decorator(self)
 
-    def wait_for(self, event, *, check=None, timeout=None):
+    def wait_for(self, event, *, check=None, timeout=None, channel=None,
+                 author=None):
         """
         Waits for a WebSocket event to be dispatched.
         This could be used to wait for a user to reply to a message,
@@ -120,6 +279,24 @@ class Client:
             the event returns multiple arguments, a :class:`tuple` containing
             those arguments is returned instead. This function returns the
             **first event that meets the requirements**.
+
+        Parameters
+        -----------
+
+        event: :class:`str`
+            The name of the event to wait for
+        check: Optional[Callable[..., :class:`bool`]]
+            A predicate the event's arguments must pass
+        timeout: Optional[:class:`float`]
+            The amount of seconds to wait for before giving up
+        channel: Optional[:class:`str`]
+            Only considers events about the channel with this name. Unlike
+            filtering in ``check``, events about other channels never run
+            ``check``, which matters with thousands of pending waits
+        author: Optional[:class:`str`]
+            Only considers events whose author has this login, such as a
+            :class:`Message` sent by that user, or events about that
+            :class:`User`, such as :attr:`Event.USER_JOIN_CHANNEL`
         """
         future = self.loop.create_future()
         if not check:
@@ -127,8 +304,8 @@ class Client:
                 return True
             check = _c
 
-        listener = self.event_handler[event]
-        listener.append((future, check))
+        self.event_handler.add_waiter(event, future, check, channel=channel,
+                                      author=author)
         return asyncio.wait_for(future, timeout=timeout, loop=self.loop)
 
     # ============== #
@@ -142,11 +319,12 @@ class Client:
         .. warning::
 
             There isn't actually an endpoint provided by Twitch to receive
-            one user, so this method is just a wrapper around ``get_users()``
-            and returns the first user that matches the user_id OR login the
-            caller passes in. You should only pass in a user_id AND login
-            if they are referencing the same user. Otherwise, it's fine to
-            just pass in either a single user_id or login.
+            one user, so concurrent calls are batched together into a
+            single ``get_users()`` request. When both a user_id AND login
+            are passed, the user is looked up by its user_id, so you should
+            only pass in both if they are referencing the same user.
+            Otherwise, it's fine to just pass in either a single user_id or
+            login.
 
 
         Parameters
@@ -158,13 +336,17 @@ class Client:
         login: Optional[:class:`str`]
             A user's login name (NOT display name)
         """
-        user_ids = [user_id] if user_id else None
-        logins = [login] if login else None
-        users = await self.get_users(user_ids=user_ids, logins=logins)
-        user_id = int(user_id) if user_id else user_id
-        for user in users:
-            if user_id == user.id or login == user.login:
-                return user
+        if not user_id and not login:
+            return None
+
+        found, user = self.user_cache.get(user_id=user_id, login=login)
+        if not found:
+            # the future is shared with every other caller waiting on the
+            # same user, so it must not be cancelled by this one
+            user = await asyncio.shield(
+                self._user_loader.load(user_id=user_id, login=login),
+                loop=self.loop)
+        return copy.copy(user) if user else None
 
     async def get_users(self, *, user_ids=None, logins=None):
         """List[:class:`~twitch.User`]: Returns a list of all the users defined
@@ -181,16 +363,249 @@ class Client:
 
         """
         users = []
-        resps = await self.http.get_users(user_ids=user_ids, logins=logins)
-        for resp in resps:
-            users += [User(data, session=self) for data in resp['data'] if
-                      resp and resp['data']]
+        missing_ids = []
+        missing_logins = []
+        for user_id in user_ids or []:
+            found, user = self.user_cache.get(user_id=user_id)
+            if not found:
+                missing_ids.append(user_id)
+            elif user:
+                users.append(copy.copy(user))
+        for login in logins or []:
+            found, user = self.user_cache.get(login=login)
+            if not found:
+                missing_logins.append(login)
+            elif user:
+                users.append(copy.copy(user))
+
+        if missing_ids or missing_logins:
+            fetched = await self._load_users(user_ids=missing_ids,
+                                             logins=missing_logins)
+            # callers add tag data to the users they get back, so the
+            # cached user must never be handed out directly
+            users += [copy.copy(user) for user in fetched]
         return users
 
+    async def iter_users(self, *, user_ids=None, logins=None):
+        """
+        An async generator version of :meth:`get_users`. The Helix API only
+        accepts 100 users per request, so for large lists users are
+        yielded as soon as their request completes, while the rest are
+        still in flight.
+
+        .. code-block:: python3
+
+            async for user in client.iter_users(logins=names):
+                print(user.display_name)
+
+        Parameters
+        -----------
+
+        user_ids: Optional[List[:class:`int`]]
+            A list of user id's
+
+        logins: Optional[List[:class:`str`]]
+            A list of user's login names (NOT display names)
+        """
+        missing_ids = []
+        missing_logins = []
+        for user_id in user_ids or []:
+            found, user = self.user_cache.get(user_id=user_id)
+            if not found:
+                missing_ids.append(user_id)
+            elif user:
+                yield copy.copy(user)
+        for login in logins or []:
+            found, user = self.user_cache.get(login=login)
+            if not found:
+                missing_logins.append(login)
+            elif user:
+                yield copy.copy(user)
+
+        if not missing_ids and not missing_logins:
+            return
+
+        fetched_logins = set()
+        async for resp in self.http.iter_users(user_ids=missing_ids,
+                                               logins=missing_logins):
+            for data in resp['data'] if resp and resp['data'] else []:
+                user = User(data, session=self)
+                self.user_cache.put(user)
+                fetched_logins.add(user.login.lower())
+                yield copy.copy(user)
+
+        for login in missing_logins:
+            if login.lower() not in fetched_logins:
+                self.user_cache.put_missing(login)
+
+    async def _load_users(self, *, user_ids=None, logins=None):
+        fetched = await self._fetch_users(user_ids=user_ids, logins=logins)
+        for user in fetched:
+            self.user_cache.put(user)
+
+        fetched_logins = {user.login.lower() for user in fetched}
+        for login in logins or []:
+            if login.lower() not in fetched_logins:
+                self.user_cache.put_missing(login)
+        return fetched
+
+    async def _fetch_users(self, *, user_ids=None, logins=None):
+        payloads = []
+        shared_users = self._shared_users
+        if shared_users is not None:
+            # a blocking round trip to the manager process, which mustn't
+            # stall the loop, and with it every shard
+            payloads, user_ids, logins = await self.loop.run_in_executor(
+                None, partial(shared_users.get_many, user_ids=user_ids,
+                              logins=logins))
+
+        if user_ids or logins:
+            resps = await self.http.get_users(user_ids=user_ids,
+                                              logins=logins)
+            fetched = [data for resp in resps if resp and resp['data']
+                       for data in resp['data']]
+            if shared_users is not None and fetched:
+                await self.loop.run_in_executor(
+                    None, shared_users.put_many, fetched)
+            payloads += fetched
+        return [User(data, session=self) for data in payloads]
+
     # =================== #
     # websocket utilities #
     # =================== #
 
+    def get_channel(self, channel_name):
+        """
+        Returns the :class:`Channel` with the name passed if the client has
+        joined it, otherwise ``None``.
+
+        Parameters
+        -----------
+
+        channel_name: :class:`str`
+            The name of the channel
+        """
+        return self.channels.get(channel_name.lstrip('#').lower())
+
+    def _get_or_create_channel(self, channel_name):
+        channel = self.channels.get(channel_name)
+        if channel is None:
+            channel = Channel(channel_name, session=self, tags_data=None)
+            self.channels[channel_name] = channel
+        return channel
+
+    def _get_known_channel(self, channel_name, *, create=False):
+        """
+        Returns the channel from the registry. It is only created if it is
+        being joined, or if ``create`` is true, so lines trailing our own
+        PART don't bring a channel that was left back.
+        """
+        channel = self.channels.get(channel_name)
+        if channel is None and (create or channel_name in self._assignments):
+            channel = self._get_or_create_channel(channel_name)
+        return channel
+
+    def _remove_channel(self, channel_name):
+        shard_id = self._assignments.pop(channel_name, None)
+        if shard_id is not None:
+            self.shards[shard_id].channels.discard(channel_name)
+        return self.channels.pop(channel_name, None)
+
+    # ================ #
+    # shard management #
+    # ================ #
+
+    @property
+    def latency(self):
+        """
+        The average heartbeat round trip time of the primary shard, in
+        seconds. ``float('inf')`` until it was measured.
+
+        :type: :class:`float`
+        """
+        shard = self.shards.get(0)
+        return shard.latency if shard else float('inf')
+
+    @property
+    def latencies(self):
+        """
+        The heartbeat round trip time of every shard, as
+        ``(shard id, latency)`` tuples.
+
+        :type: List[Tuple[:class:`int`, :class:`float`]]
+        """
+        return [(shard_id, shard.latency)
+                for shard_id, shard in sorted(self.shards.items())]
+
+    @property
+    def ws(self):
+        """
+        The websocket of the primary shard. Could be ``None``.
+        """
+        shard = self.shards.get(0)
+        return shard.ws if shard else None
+
+    @property
+    def ingress(self):
+        """
+        The ingress queue of the primary shard. Could be ``None``.
+        """
+        shard = self.shards.get(0)
+        return shard.ingress if shard else None
+
+    def get_shard(self, channel_name):
+        """
+        Returns the :class:`Shard` that owns the channel with the name
+        passed. For a channel that wasn't joined, the shard it would be
+        assigned to on the hash ring.
+
+        Parameters
+        -----------
+
+        channel_name: :class:`str`
+            The name of the channel
+        """
+        channel_name = channel_name.lstrip('#').lower()
+        shard_id = self._assignments.get(channel_name)
+        if shard_id is None:
+            self._ensure_shards()
+            shard_id = self._ring.get(channel_name)
+        return self.shards[shard_id]
+
+    def _assign_shard(self, channel_name):
+        shard_id = self._assignments.get(channel_name)
+        if shard_id is not None:
+            return self.shards[shard_id]
+
+        self._ensure_shards()
+
+        cap = self._max_channels_per_shard
+        for shard_id in self._ring.iter_nodes(channel_name):
+            if cap is None or len(self.shards[shard_id].channels) < cap:
+                shard = self.shards[shard_id]
+                break
+        else:
+            # every shard is full, open another connection
+            shard = self._add_shard(max(self.shards) + 1)
+
+        self._assignments[channel_name] = shard.id
+        shard.channels.add(channel_name)
+        return shard
+
+    def _ensure_shards(self):
+        for shard_id in range(self._shard_count):
+            if shard_id not in self.shards:
+                self._add_shard(shard_id)
+
+    def _add_shard(self, shard_id):
+        shard = Shard(shard_id, self)
+        self.shards[shard_id] = shard
+        self._ring.add(shard_id)
+        log.debug(f'added shard {shard_id}')
+        if self._stopped is not None and not self._stopped.done():
+            self._start_shard(shard)
+        return shard
+
     async def join_channel(self, channel_name):
         """
         Sends an IRC message to the Websocket server to join the channel
@@ -201,6 +616,8 @@ class Client:
             Once the client is connected, you must explicitly join channels
             yourself, otherwise you won't receive any useful Events as they
             are all based on things happening while listening to channels.
+            Joined channels are rejoined automatically after a reconnect,
+            after which :attr:`Event.CHANNELS_REJOINED` is dispatched.
 
         Parameters
         -----------
@@ -208,7 +625,196 @@ class Client:
         channel_name: :class:`str`
             The name of the channel you wish to join
         """
-        await self.ws.send_join(channel_name)
+        channel_name = channel_name.lstrip('#').lower()
+        shard = self._assign_shard(channel_name)
+        shard._joining.add(channel_name)
+        try:
+            await shard.wait_until_connected()
+            await shard.ws.send_join(channel_name)
+        finally:
+            shard._joining.discard(channel_name)
+
+    async def join_channels(self, channel_names, *, wait=True, timeout=10.0):
+        """
+        Joins many channels at once. The channels are packed into as few
+        ``JOIN #a,#b,...`` lines as the IRC line length allows, sent as
+        fast as the join rate limit allows.
+
+        Parameters
+        -----------
+
+        channel_names: List[:class:`str`]
+            The names of the channels you wish to join
+        wait: Optional[:class:`bool`]
+            If true, waits until Twitch confirmed every join and returns the
+            joined :class:`Channel` objects. Otherwise, returns a
+            :class:`dict` of channel name to a future resolving to its
+            :class:`Channel` once confirmed. The futures are shared with
+            other joins of the same channels, shield them before cancelling.
+            Defaults to ``True``
+        timeout: Optional[:class:`float`]
+            The amount of seconds to wait for the confirmations, once every
+            JOIN was sent. ``None`` waits forever. Defaults to ``10``
+
+        Raises
+        -------
+        :exc:`asyncio.TimeoutError`
+            Some of the joins weren't confirmed in time.
+        :exc:`.ChannelJoinFailure`
+            Twitch refused to join one of the channels, e.g. because it is
+            suspended.
+        """
+        futures = {}
+        by_shard = {}
+        for channel_name in channel_names:
+            channel_name = channel_name.lstrip('#').lower()
+            if channel_name in futures:
+                continue
+            futures[channel_name] = self._pending_future(
+                self._pending_joins, channel_name)
+            shard = self._assign_shard(channel_name)
+            shard._joining.add(channel_name)
+            by_shard.setdefault(shard, []).append(channel_name)
+
+        async def join(shard, names):
+            sent = False
+            try:
+                await shard.wait_until_connected()
+                await shard.ws.send_join_many(names)
+                sent = True
+            except BaseException as e:
+                self._fail_pending(self._pending_joins, names, e)
+                raise
+            finally:
+                shard._joining.difference_update(names)
+                if not sent:
+                    # also reached on cancellation, a later join of these
+                    # channels must not reuse a future nobody will resolve
+                    self._fail_pending(self._pending_joins, names, None)
+
+        await asyncio.gather(*[join(shard, names)
+                               for shard, names in by_shard.items()],
+                             loop=self.loop)
+        if not wait:
+            return futures
+        return await self._wait_pending(futures, timeout)
+
+    async def part_channel(self, channel_name):
+        """
+        Sends an IRC message to the Websocket server to leave the channel
+        specified.
+
+        Parameters
+        -----------
+
+        channel_name: :class:`str`
+            The name of the channel you wish to leave
+        """
+        await self.part_channels([channel_name], wait=False)
+
+    async def part_channels(self, channel_names, *, wait=True, timeout=10.0):
+        """
+        Leaves many channels at once, packed into as few
+        ``PART #a,#b,...`` lines as possible. The channels are removed from
+        :attr:`channels` once Twitch confirms it.
+
+        Parameters
+        -----------
+
+        channel_names: List[:class:`str`]
+            The names of the channels you wish to leave
+        wait: Optional[:class:`bool`]
+            If true, waits until Twitch confirmed every part. Otherwise,
+            returns a :class:`dict` of channel name to a future resolved
+            once confirmed. Defaults to ``True``
+        timeout: Optional[:class:`float`]
+            The amount of seconds to wait for the confirmations, once every
+            PART was sent. ``None`` waits forever. Defaults to ``10``
+        """
+        futures = {}
+        by_shard = {}
+        for channel_name in channel_names:
+            channel_name = channel_name.lstrip('#').lower()
+            shard_id = self._assignments.get(channel_name)
+            if shard_id is None or channel_name in futures:
+                continue
+            futures[channel_name] = self._pending_future(
+                self._pending_parts, channel_name)
+            by_shard.setdefault(self.shards[shard_id], []).append(
+                channel_name)
+
+        unsent = list(futures)
+        try:
+            for shard, names in by_shard.items():
+                await shard.wait_until_connected()
+                await shard.ws.send_part_many(names)
+                unsent = [name for name in unsent if name not in names]
+        except BaseException as e:
+            self._fail_pending(self._pending_parts, unsent, e)
+            raise
+        if not wait:
+            return futures
+        await self._wait_pending(futures, timeout)
+
+    def _pending_future(self, pending, channel_name):
+        future = pending.get(channel_name)
+        if future is None or future.done():
+            future = self.loop.create_future()
+            pending[channel_name] = future
+        return future
+
+    def _fail_pending(self, pending, channel_names, exc):
+        """
+        Forgets the pending futures of channels whose JOIN or PART wasn't
+        sent, failing them with ``exc``, or cancelling them without one.
+        """
+        for channel_name in channel_names:
+            future = pending.pop(channel_name, None)
+            if future is None or future.done():
+                continue
+            if exc is None or isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                # the error is raised to the caller already, don't let
+                # asyncio log it again when nobody awaits the future
+                future.exception()
+
+    async def _wait_pending(self, futures, timeout):
+        if not futures:
+            return []
+        # other callers may wait on the same futures. Unlike wait_for,
+        # asyncio.wait doesn't cancel them when this caller times out
+        futures = list(futures.values())
+        done, pending = await asyncio.wait(
+            futures, timeout=timeout, return_when=asyncio.FIRST_EXCEPTION,
+            loop=self.loop)
+        for future in futures:
+            if future in done and not future.cancelled() and \
+                    future.exception() is not None:
+                raise future.exception()
+        if pending:
+            raise asyncio.TimeoutError()
+        return [future.result() for future in futures]
+
+    def _confirm_join(self, channel):
+        future = self._pending_joins.pop(channel.name, None)
+        if future is not None and not future.done():
+            future.set_result(channel)
+
+    def _fail_join(self, channel_name, exc):
+        # Twitch refused the JOIN, the channel must not be rejoined on the
+        # next reconnect either
+        if channel_name not in self.channels:
+            self._remove_channel(channel_name)
+        future = self._pending_joins.pop(channel_name, None)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+
+    def _confirm_part(self, channel):
+        future = self._pending_parts.pop(channel.name, None)
+        if future is not None and not future.done():
+            future.set_result(channel)
 
     async def send_message(self, channel_name, message):
         """
@@ -227,7 +833,9 @@ class Client:
         # TODO: maybe add an opt-in parameter to wait for the sent message
         # and return it instead of getting nothing back. Might be useful
         # for some users since they'd get the full metadata of their message
-        await self.ws.send_message(channel_name, message)
+        shard = self.get_shard(channel_name)
+        await shard.wait_until_connected()
+        await shard.ws.send_message(channel_name, message)
 
     # ===================== #
     # connection management #
@@ -244,14 +852,6 @@ class Client:
         """
         await self.event_handler.connected.wait()
 
-    async def _connect(self):
-        ws = WebSocketClient.create_client(self)
-        user = await self.get_user(login=self.username)
-        self.ws = await asyncio.wait_for(ws, timeout=120.0, loop=self.loop)
-        self.event_handler.emit(Event.CONNECTED, user)
-        while True:
-            await self.ws.poll_event()
-
     async def connect(self, *, reconnect=True):
         """
         Creates a websocket connection and lets the websocket listen
@@ -262,42 +862,37 @@ class Client:
         -----------
         reconnect: :class:`bool`
             If we should attempt reconnecting, either due to internet
-            failure or a specific failure on Twitch's part.
+            failure or a specific failure on Twitch's part. Every shard
+            reconnects on its own.
         Raises
         -------
         :exc:`.WebSocketConnectionClosed`
             The websocket connection has been terminated.
         """
 
-        backoff = TwitchBackoff()
-        while not self._closed:
-            try:
-                await self._connect()
-            except (OSError,
-                    HTTPException,
-                    WebSocketConnectionClosed,
-                    WebSocketLoginFailure,
-                    aiohttp.ClientError,
-                    asyncio.TimeoutError,
-                    websockets.InvalidHandshake,
-                    websockets.WebSocketProtocolError) as e:
-
-                self.event_handler.emit(Event.DISCONNECT)
-                if not reconnect:
-                    await self.close()
-                    if isinstance(e,
-                                  WebSocketConnectionClosed) and \
-                            e.code == 1000:
-                        # websocket was closed cleanly, no need to raise here
-                        return
-                    raise
-
-                if self._closed:
-                    return
-
-                retry = backoff.sleep_for()
-                log.exception(f'attemping to reconnect in {retry}s')
-                await asyncio.sleep(retry, loop=self.loop)
+        self._reconnect = reconnect
+        self._stopped = self.loop.create_future()
+        self._ensure_shards()
+        for shard in list(self.shards.values()):
+            self._start_shard(shard)
+        try:
+            await self._stopped
+        finally:
+            self._stopped = None
+
+    def _start_shard(self, shard):
+        task = shard.start(reconnect=self._reconnect)
+        task.add_done_callback(self._on_shard_stopped)
+
+    def _on_shard_stopped(self, task):
+        stopped = self._stopped
+        if stopped is None or stopped.done():
+            return
+        if not task.cancelled() and task.exception() is not None:
+            stopped.set_exception(task.exception())
+        elif all(shard._task is None or shard._task.done()
+                 for shard in self.shards.values()):
+            stopped.set_result(None)
 
     async def close(self):
         """
@@ -308,9 +903,10 @@ class Client:
         await self.http.close_session()
         self._closed = True
 
-        if self.ws and self.ws.open:
-            await self.ws.close()
+        for shard in self.shards.values():
+            await shard.close()
 
+        self.event_handler.stop()
         self.event_handler.clear_connected()
 
     async def clear(self):
@@ -3,6 +3,10 @@ import asyncio
 from functools import partial
 
 from .events import Event
+from .backpressure import BoundedQueue, Overflow
+from .channel import Channel
+from .user import User
+from .metrics import Metrics, Stage
 
 log = logging.getLogger(__name__)
 
@@ -25,64 +29,215 @@ class _EventTask(asyncio.Task):
         return f'<EventTask {task}>'
 
 
+# how a listener is called by EventHandler.emit
+_CALL = 0  # plain function, called inline
+_TASK = 1  # coroutine function, run in a new task
+_QUEUE = 2  # _QueuedListener, queues the event for its workers
+
+
+class _QueuedListener:
+    """
+    Runs a coroutine listener in a fixed amount of worker tasks fed by
+    bounded queues, instead of a new task per event.
+
+    With ``serial_per_channel``, every worker has its own queue and the
+    events of a channel always go to the same worker, so they are handled
+    one at a time and in order. Otherwise the workers share a single queue.
+    """
+    def __init__(self, coro, event_name, *, loop, concurrency, queue_size,
+                 overflow, serial_per_channel, timings):
+        self.coro = coro
+        self.event_name = event_name
+        self.loop = loop
+        self.timings = timings
+        self.serial_per_channel = serial_per_channel
+        self._concurrency = concurrency
+        amount = concurrency if serial_per_channel else 1
+        self._queues = [
+            BoundedQueue(max(queue_size // amount, 1), overflow, loop=loop)
+            for _ in range(amount)]
+        self._workers = []
+        self._blocked = set()
+        self._processed = 0
+
+    def __call__(self, *args, **kwargs):
+        if not self._workers:
+            self._start()
+
+        queue = self._queues[0]
+        if self.serial_per_channel:
+            key = _channel_key(args)
+            queue = self._queues[hash(key) % len(self._queues)]
+
+        item = (args, kwargs)
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Overflow.BLOCK: park the event until there is room, the
+            # client stops reading new messages until it is queued
+            task = self.loop.create_task(queue.put(item))
+            self._blocked.add(task)
+            task.add_done_callback(self._blocked.discard)
+
+    @property
+    def blocked(self):
+        return self._blocked
+
+    def metrics(self):
+        queues = [queue.metrics() for queue in self._queues]
+        return {'queued': sum(q['depth'] for q in queues),
+                'blocked': len(self._blocked),
+                'dropped': sum(q['dropped'] for q in queues),
+                'processed': self._processed,
+                'max_lag': max(q['max_lag'] for q in queues)}
+
+    def _start(self):
+        for i in range(self._concurrency):
+            queue = self._queues[i % len(self._queues)]
+            self._workers.append(self.loop.create_task(self._work(queue)))
+
+    def stop(self):
+        for task in self._workers + list(self._blocked):
+            task.cancel()
+        self._workers = []
+
+    async def _work(self, queue):
+        while True:
+            args, kwargs = await queue.get()
+            timings = self.timings
+            timings.observe_duration(Stage.QUEUE_WAIT, queue.lag)
+            start = timings.start()
+            # unlike _run_event, cancellation must stop the worker
+            try:
+                await self.coro(*args, **kwargs)
+            except Exception as e:
+                await _on_run_error(self.event_name, str(e))
+            timings.observe(Stage.HANDLER_RUN, start)
+            self._processed += 1
+
+
 class EventHandler:
-    def __init__(self, loop):
+    def __init__(self, loop, metrics=None):
         self.loop = loop
-        self._listeners = {}
+        # the per-stage timings, not to be confused with metrics() which
+        # reports the listener queues
+        self.timings = metrics if metrics is not None else Metrics()
+        # event -> (channel name, author login) -> {future: check}
+        self._waiters = {}
         self._handlers = {Event.CONNECTED: self._handle_connected}
+        # event -> tuple of (callback, mode), built on register so emit
+        # never has to look anything up by attribute name
+        self._dispatch = {}
+        # (event, listener name) -> _QueuedListener
+        self._queued = {}
         self._connected = asyncio.Event(loop=self.loop)
 
-    def __getitem__(self, event):
-        try:
-            listener = self._listeners[event]
-        except KeyError:
-            listener = []
-            self._listeners[event] = listener
-        return listener
+    def add_waiter(self, event, future, check, *, channel=None, author=None):
+        """
+        Resolves ``future`` with the arguments of the first ``event`` that
+        passes ``check``. With ``channel`` and/or ``author``, the waiter is
+        filed under those names and ``check`` only runs for events about
+        that channel and author.
+        """
+        key = (channel.lstrip('#').lower() if channel else None,
+               author.lower() if author else None)
+        buckets = self._waiters.setdefault(event, {})
+        bucket = buckets.setdefault(key, {})
+        bucket[future] = check
+        # removes cancelled and timed out waiters without a scan
+        future.add_done_callback(
+            partial(self._remove_waiter, event, key))
 
-    def register(self, event, coro):
-        real_coro = coro.func if isinstance(coro, partial) else coro
-        coro_name = real_coro.__name__
+    def _remove_waiter(self, event, key, future):
+        buckets = self._waiters.get(event)
+        if buckets is None:
+            return
+        bucket = buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(future, None)
+        if not bucket:
+            del buckets[key]
+            if not buckets:
+                del self._waiters[event]
 
-        if not asyncio.iscoroutinefunction(real_coro):
-            raise TypeError(
-                f'{coro_name} '
-                f'must be a coroutine function to be registered')
+    def register(self, event, coro, *, concurrency=None, queue_size=None,
+                 overflow=Overflow.DROP_OLDEST, serial_per_channel=False):
+        real_coro = coro.func if isinstance(coro, partial) else coro
+        if not callable(real_coro):
+            raise TypeError(f'{real_coro!r} must be callable to be '
+                            f'registered')
+        coro_name = _listener_name(coro)
 
         event = f'on_{event}' if not event.startswith('on_') else event
 
-        def get_name(coro):
-            return coro.func.__name__ if isinstance(coro, partial) else \
-                coro.__name__
-
-        coros = getattr(self, event, [])
         # ensure the same on_message coro can't be registered twice
-        if coro_name not in [get_name(c) for c in coros]:
-            coros.append(coro)
-        setattr(self, event, coros)
+        if any(_listener_name(callback) == coro_name
+               for callback, _ in self._dispatch.get(event[3:], ())):
+            return
+
+        mode = _TASK if asyncio.iscoroutinefunction(real_coro) else _CALL
+        if mode == _TASK and (concurrency or serial_per_channel or
+                              queue_size):
+            coro = _QueuedListener(
+                coro, event, loop=self.loop, concurrency=concurrency or 1,
+                queue_size=queue_size or 1000, overflow=overflow,
+                serial_per_channel=serial_per_channel, timings=self.timings)
+            self._queued[(event, coro_name)] = coro
+            mode = _QUEUE
+
+        self._dispatch[event[3:]] = \
+            self._dispatch.get(event[3:], ()) + ((coro, mode),)
 
     def emit(self, event, *args, **kwargs):
         handler = self._handlers.get(event)
         if handler:
-            log.info(f'invoking custom handler for {event}')
+            log.debug('invoking custom handler for %s', event)
             handler()
 
-        log.info(f'emitting event {event}')
-        method = f'on_{event}'
+        if event in self._waiters:
+            self._notify_waiters(event, args)
+
+        dispatch = self._dispatch.get(event)
+        if not dispatch:
+            return
+
+        log.debug('emitting event %s', event)
+        for callback, mode in dispatch:
+            if mode == _TASK:
+                self._schedule_event(callback, event, *args, **kwargs)
+            elif mode == _QUEUE:
+                callback(*args, **kwargs)
+            else:
+                # plain functions are called inline, without creating a task
+                start = self.timings.start()
+                try:
+                    callback(*args, **kwargs)
+                except Exception as e:
+                    log.info(f'ignoring exception in on_{event}: {e}')
+                self.timings.observe(Stage.HANDLER_RUN, start)
+
+    def _notify_waiters(self, event, args):
+        buckets = self._waiters[event]
+        channel = _channel_key(args)
+        author = _author_key(args)
+        keys = {(None, None), (channel, None), (None, author),
+                (channel, author)}
+
+        for key in keys:
+            bucket = buckets.get(key)
+            if not bucket:
+                continue
 
-        listeners = self._listeners.get(event)
-        if listeners:
-            removed = []
-            for i, (future, condition) in enumerate(listeners):
-                if future.cancelled():
-                    removed.append(i)
+            for future, check in list(bucket.items()):
+                if future.done():
                     continue
 
                 try:
-                    result = condition(*args)
+                    result = check(*args)
                 except Exception as exc:
                     future.set_exception(exc)
-                    removed.append(i)
+                    self._remove_waiter(event, key, future)
                 else:
                     if result:
                         if len(args) == 0:
@@ -91,27 +246,37 @@ class EventHandler:
                             future.set_result(args[0])
                         else:
                             future.set_result(args)
-                        removed.append(i)
+                        self._remove_waiter(event, key, future)
 
-            if len(removed) == len(listeners):
-                self._listeners.pop(event)
-            else:
-                for idx in reversed(removed):
-                    del listeners[idx]
+    def _schedule_event(self, coro, event, *args, **kwargs):
+        event_name = f'on_{event}'
+        wrapped_coro = _run_event(coro, event_name, *args, **kwargs)
+        if self.timings.enabled:
+            wrapped_coro = _timed(self.timings, wrapped_coro)
+        _EventTask(original_coro=coro, event_name=event_name,
+                   coro=wrapped_coro, loop=self.loop)
 
-        try:
-            coros = getattr(self, method)
-            self._schedule_event(coros, method, *args, **kwargs)
-        except AttributeError:
-            pass
+    def metrics(self):
+        """
+        Returns the queue metrics of every listener registered with a
+        concurrency limit, by ``"<event>:<listener name>"``.
+        """
+        return {f'{event}:{name}': listener.metrics()
+                for (event, name), listener in self._queued.items()}
 
-    def _schedule_event(self, coros, event_name, *args, **kwargs):
-        # schedule the tasks
-        for wrapped_coro, coro in [
-            (_run_event(coro, event_name, *args, **kwargs), coro)
-                for coro in coros]:
-            _EventTask(original_coro=coro, event_name=event_name,
-                       coro=wrapped_coro, loop=self.loop)
+    async def wait_for_room(self):
+        """
+        Waits until every event queued for a listener using
+        :attr:`Overflow.BLOCK` found room in its queue.
+        """
+        blocked = [task for listener in self._queued.values()
+                   for task in listener.blocked]
+        if blocked:
+            await asyncio.wait(blocked, loop=self.loop)
+
+    def stop(self):
+        for listener in self._queued.values():
+            listener.stop()
 
     @property
     def connected(self):
@@ -128,6 +293,14 @@ async def _on_run_error(method, err):
     log.info(f'ignoring exception in {method}: {err}')
 
 
+async def _timed(timings, coro):
+    start = timings.start()
+    try:
+        await coro
+    finally:
+        timings.observe(Stage.HANDLER_RUN, start)
+
+
 async def _run_event(coro, event_name, *args, **kwargs):
     try:
         await coro(*args, **kwargs)
@@ -138,3 +311,42 @@ async def _run_event(coro, event_name, *args, **kwargs):
             await _on_run_error(event_name, str(e))
         except asyncio.CancelledError:
             pass
+
+
+def _listener_name(callback):
+    if isinstance(callback, _QueuedListener):
+        callback = callback.coro
+    if isinstance(callback, partial):
+        callback = callback.func
+    return getattr(callback, '__name__', None) or repr(callback)
+
+
+def _channel_key(args):
+    """
+    The name of the channel an event is about: a :class:`Channel`
+    argument, a ``#channel`` name, or the channel of a model argument.
+    """
+    for arg in args:
+        if isinstance(arg, Channel):
+            return arg.name
+        if isinstance(arg, str):
+            if arg.startswith('#'):
+                return arg[1:].lower()
+            continue
+        channel = getattr(arg, 'channel', None)
+        if isinstance(channel, Channel):
+            return channel.name
+    return None
+
+
+def _author_key(args):
+    """
+    The login of the user an event is about: a :class:`User` argument, or
+    the author of a model argument.
+    """
+    for arg in args:
+        user = arg if isinstance(arg, User) else getattr(arg, 'author', None)
+        if user is not None:
+            login = getattr(user, 'login', None)
+            return login.lower() if login else None
+    return None
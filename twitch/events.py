@@ -30,6 +30,28 @@ class Event:
             print('Client disconnected')
     """
 
+    SHARD_CONNECTED = 'shard_connected'
+    """
+    Called when one of the client's websocket connections has connected,
+    including after a reconnect.
+
+    :param shard_id: The id of the :class:`Shard` that connected
+
+    .. code-block:: python3
+
+        @client.event(twitch.Event.SHARD_CONNECTED)
+        async def on_shard_connected(shard_id):
+            print(f'Shard {shard_id} connected')
+    """
+
+    SHARD_DISCONNECTED = 'shard_disconnected'
+    """
+    Called when one of the client's websocket connections is closed. Only
+    the channels of that shard are affected.
+
+    :param shard_id: The id of the :class:`Shard` that disconnected
+    """
+
     SOCKET_SEND = 'socket_send'
     """
     Called when the Websocket client sends a message to the server.
@@ -121,6 +143,19 @@ class Event:
 
     CHANNELS_REJOINED = 'channels_rejoined'
     """
+    Called once Twitch confirmed, or failed to confirm in time, the rejoins
+    of the channels a connection was in before it reconnected.
+
+    :param channel_names: The names of the channels rejoined
+    :param failed: The names of the channels that weren't rejoined, because
+        Twitch refused it or didn't confirm it in time
+
+    .. code-block:: python3
+
+        @client.event(twitch.Event.CHANNELS_REJOINED)
+        async def on_rejoined(channel_names, failed):
+            print(f'Rejoined {len(channel_names)} channels, '
+                  f'{len(failed)} failed')
     """
 
     CHANNEL_STATE_CHANGED = 'channel_state_update'
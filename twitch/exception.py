@@ -37,13 +37,24 @@ class ClientException(TwitchException):
     pass
 
 
+class ChannelJoinFailure(ClientException):
+    def __init__(self, channel_name, msg_id, message):
+        super().__init__(f'could not join channel {channel_name}: {message}')
+        self.channel_name = channel_name
+        # the msg-id of the NOTICE Twitch refused the join with
+        self.msg_id = msg_id
+
+
 class WebSocketException(TwitchException):
     def __init__(self, original):
         super().__init__(str(original))
 
 
 class WebSocketConnectionClosed(WebSocketException):
-    pass
+    def __init__(self, original):
+        super().__init__(original)
+        # the close code of the websockets exception, if there is one
+        self.code = getattr(original, 'code', None)
 
 
 class WebSocketLoginFailure(WebSocketException):
@@ -3,32 +3,109 @@ import sys
 import logging
 import datetime
 from multidict import MultiDict
-from weakref import WeakValueDictionary
 from itertools import zip_longest
 
 import aiohttp
 
 from . import __version__
+from .metrics import Metrics, Stage
 from .exception import HTTPException, HTTPNotAuthorized, HTTPNotFound, \
     HTTPForbidden
 
 log = logging.getLogger(__name__)
 
 
-class LockHelper:
-    def __init__(self, lock):
-        self.lock = lock
-        self._unlock = True
+class RateLimitBucket:
+    """
+    A client side token bucket for the Helix rate limit. Twitch keeps one
+    bucket per token, shared by every endpoint, so a :class:`HTTPClient`
+    has a single one.
+
+    The bucket starts out with :attr:`DEFAULT_LIMIT` points and is corrected
+    from the ``Ratelimit-Limit``, ``Ratelimit-Remaining`` and
+    ``Ratelimit-Reset`` headers of every response. Requests only wait once
+    no points are left, in which case they are queued in order and
+    released when the bucket resets.
+
+    When several processes share the same credentials, ``share`` is the
+    fraction of the points this process may use. The limit and remaining
+    points Twitch reports are scaled by it, so together the processes
+    never use more than what is left.
+    """
+    # https://dev.twitch.tv/docs/api/guide 'Rate Limits' section, bearer
+    # token requests get 800 points per minute
+    DEFAULT_LIMIT = 800
+    DEFAULT_PERIOD = 60
+
+    def __init__(self, *, loop, limit=DEFAULT_LIMIT, share=1.0):
+        self.loop = loop
+        self.share = share
+        self.limit = max(self._scale(limit), 1)
+        self.remaining = self.limit
+        self._reset_at = None
+        self._in_flight = 0
+        # asyncio.Lock wakes waiters in FIFO order, which is what makes the
+        # queue fair once the points run out
+        self._lock = asyncio.Lock(loop=loop)
 
-    def __enter__(self):
-        return self
-
-    def defer(self):
-        self._unlock = False
-
-    def __exit__(self, type, value, traceback):
-        if self._unlock:
-            self.lock.release()
+    @property
+    def reset_after(self):
+        if self._reset_at is None:
+            return 0
+        return max(self._reset_at - self.loop.time(), 0)
+
+    async def acquire(self):
+        # fast path, nobody is queued and there are points left
+        if self.remaining > 0 and not self._lock.locked():
+            self._take()
+            return
+
+        async with self._lock:
+            while self.remaining <= 0:
+                delay = self.reset_after
+                if delay <= 0:
+                    self.remaining = self.limit
+                    self._reset_at = None
+                    break
+                log.info(f'rate limit bucket exhausted, waiting {delay} '
+                         f'seconds for it to reset')
+                await asyncio.sleep(delay, loop=self.loop)
+            self._take()
+
+    def release(self):
+        self._in_flight -= 1
+
+    def update(self, headers):
+        limit = headers.get('ratelimit-limit')
+        if limit:
+            self.limit = max(self._scale(int(limit)), 1)
+
+        reset = headers.get('ratelimit-reset')
+        if reset:
+            reset_seconds = HTTPClient._get_ratelimit_reset(int(reset))
+            self._reset_at = self.loop.time() + max(reset_seconds, 0)
+
+        remaining = headers.get('ratelimit-remaining')
+        if remaining:
+            # the server hasn't counted the requests that are still in
+            # flight yet
+            self.remaining = max(
+                self._scale(int(remaining)) - self._in_flight, 0)
+
+    def exhaust(self, headers, fallback):
+        self.update(headers)
+        self.remaining = 0
+        if 'ratelimit-reset' not in headers:
+            self._reset_at = self.loop.time() + fallback
+
+    def _scale(self, points):
+        return int(points * self.share)
+
+    def _take(self):
+        if self._reset_at is None:
+            self._reset_at = self.loop.time() + RateLimitBucket.DEFAULT_PERIOD
+        self.remaining -= 1
+        self._in_flight += 1
 
 
 class HTTPRoute:
@@ -48,14 +125,20 @@ class HTTPClient:
     RETRY_LIMIT = 10
     TOKEN_PREFIX = 'oauth:'
 
-    def __init__(self, connector=None, loop=None):
+    def __init__(self, connector=None, loop=None, max_concurrency=4,
+                 metrics=None, rate_limit_share=1.0):
         self.loop = loop if loop else asyncio.get_event_loop()
         self.connector = connector
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.rate_limit_share = rate_limit_share
+        # maximum amount of requests a single chunked call (such as
+        # get_users) may have in flight at once
+        self.max_concurrency = max_concurrency
         self._access_token = None
         self._client_id = None
         self._session = None
-        self._bucket_locks = WeakValueDictionary()
-        self._rate_limit_reset = None
+        self._bucket = RateLimitBucket(loop=self.loop,
+                                       share=rate_limit_share)
 
         py_version = '{1[0]}.{1[1]}'.format(__version__, sys.version_info)
         user_agent = f'TwitchBot (https://github.com/sedruk/twitch.py ' \
@@ -113,25 +196,19 @@ class HTTPClient:
         reset = datetime.datetime.fromtimestamp(reset_epoch, utc)
         return (reset - now).total_seconds()
 
-    def _handle_ratelimit(self, bucket, headers, status):
-        if 'ratelimit-remaining' in headers and 'ratelimit-reset' in headers:
-            if headers['ratelimit-remaining'] == str(0) and status != 429:
-                reset_epoch = int(headers['ratelimit-reset'])
-                reset_seconds = HTTPClient._get_ratelimit_reset(reset_epoch)
-                self._rate_limit_reset = reset_seconds
-                return reset_seconds
-        return None
-
     async def request(self, route, **kwargs):
+        start = self.metrics.start()
+        try:
+            return await self._request(route, **kwargs)
+        finally:
+            self.metrics.observe(Stage.HTTP_LOOKUP, start)
+
+    async def _request(self, route, **kwargs):
         bucket = route.bucket
         method = route.method
         url = route.url
 
-        lock = self._bucket_locks.get(bucket)
-        if not lock:
-            lock = asyncio.Lock(loop=self.loop)
-            if bucket is not None:
-                self._bucket_locks[bucket] = lock
+        rate_limit_bucket = self._bucket
 
         headers = {'User-Agent': self.user_agent}
 
@@ -147,9 +224,9 @@ class HTTPClient:
 
         kwargs['headers'] = headers
 
-        await lock.acquire()
-        with LockHelper(lock) as lock_helper:
-            for attempt in range(HTTPClient.RETRY_LIMIT):
+        for attempt in range(HTTPClient.RETRY_LIMIT):
+            await rate_limit_bucket.acquire()
+            try:
                 async with self._session.request(method, url,
                                                  **kwargs) as response:
                     log.info(
@@ -157,61 +234,46 @@ class HTTPClient:
                         f'returned {response.status}')
 
                     data = await response.json()
-
-                    reset_seconds = self._handle_ratelimit(bucket,
-                                                           response.headers,
-                                                           response.status)
-                    if reset_seconds:
-                        log.info(
-                            f'bucket {bucket} rate limit has been exhausted. '
-                            f'Retrying in {reset_seconds} seconds')
-                        lock_helper.defer()
-                        self.loop.call_later(reset_seconds, lock.release)
-
-                    if 200 <= response.status < 300:
-                        self._rate_limit_reset = None
-                        return data
-
-                    if response.status == 429:
-                        # from https://dev.twitch.tv/docs/api/guide
-                        # 'Rate Limit' section. there it states the refill
-                        # rate is per minute, since the API doesn't provide
-                        # us with when we should retry, im just
-                        # picking a reasonable value that will allow some
-                        # points to be re-filled
-                        arbitrary_retry = 5
-                        msg = f'the client is being rate limited. Bucket ' \
-                              f'{bucket} rate limit has been exceeded. ' \
-                              f'retrying in {arbitrary_retry} seconds'
-                        log.warning(msg)
-
-                        await asyncio.sleep(arbitrary_retry, loop=self.loop)
-                        log.info(
-                            f'sleep complete for the rate limited bucket '
-                            f'{bucket}. Retrying...')
-
-                        continue
-
-                    if response.status in (500, 502):
-                        retry = 1 + attempt * 2
-                        log.info(
-                            f'server side error, retrying in {retry} seconds')
-                        await asyncio.sleep(retry, loop=self.loop)
-                        continue
-
-                    if response.status == 401:
-                        raise HTTPNotAuthorized(response, data)
-                    elif response.status == 403:
-                        raise HTTPForbidden(response, data)
-                    elif response.status == 404:
-                        raise HTTPNotFound(response, data)
-                    else:
-                        raise HTTPException(response, data)
-
-            log.info(
-                f'request to {method} {url} with {kwargs.get("data")} was '
-                f'attempted {HTTPClient.RETRY_LIMIT} times without success')
-            raise HTTPException(response, data)
+            finally:
+                rate_limit_bucket.release()
+
+            if response.status == 429:
+                # the bucket sleeps until the reset the server gave us. if
+                # it didn't give us one, pick a reasonable value that will
+                # allow some points to be re-filled
+                arbitrary_retry = 5
+                rate_limit_bucket.exhaust(response.headers, arbitrary_retry)
+                log.warning(
+                    f'the client is being rate limited on {bucket}. The rate '
+                    f'limit has been exceeded. retrying in '
+                    f'{rate_limit_bucket.reset_after} seconds')
+                continue
+
+            rate_limit_bucket.update(response.headers)
+
+            if 200 <= response.status < 300:
+                return data
+
+            if response.status in (500, 502):
+                retry = 1 + attempt * 2
+                log.info(
+                    f'server side error, retrying in {retry} seconds')
+                await asyncio.sleep(retry, loop=self.loop)
+                continue
+
+            if response.status == 401:
+                raise HTTPNotAuthorized(response, data)
+            elif response.status == 403:
+                raise HTTPForbidden(response, data)
+            elif response.status == 404:
+                raise HTTPNotFound(response, data)
+            else:
+                raise HTTPException(response, data)
+
+        log.info(
+            f'request to {method} {url} with {kwargs.get("data")} was '
+            f'attempted {HTTPClient.RETRY_LIMIT} times without success')
+        raise HTTPException(response, data)
 
     # analytics
 
@@ -524,25 +586,47 @@ class HTTPClient:
 
     # users
 
-    async def get_users(self, *, user_ids=None, logins=None):
+    async def get_users(self, *, user_ids=None, logins=None,
+                        concurrency=None):
+        requests = self._users_requests(user_ids, logins, concurrency)
+        return await asyncio.gather(*requests, loop=self.loop)
+
+    async def iter_users(self, *, user_ids=None, logins=None,
+                         concurrency=None):
+        """
+        Same as :meth:`get_users`, but yields each response as soon as it
+        completes instead of waiting for every chunk.
+        """
+        requests = self._users_requests(user_ids, logins, concurrency)
+        tasks = [self.loop.create_task(request) for request in requests]
+        try:
+            for task in asyncio.as_completed(tasks, loop=self.loop):
+                yield await task
+        finally:
+            # the caller may stop iterating before every chunk is done
+            for task in tasks:
+                task.cancel()
+
+    def _users_requests(self, user_ids, logins, concurrency):
         route = HTTPRoute('GET', '/users')
 
-        all_users_ids = []
-        all_logins_ids = []
-        if user_ids:
-            u = user_ids[:100]
-            while u:
-                all_users_ids.append(u)
-                u = u[100:]
-        if logins:
-            lo = logins[:100]
-            while lo:
-                all_logins_ids.append(lo)
-                lo = lo[100:]
-
-        responses = []
-        requests = zip_longest(all_users_ids, all_logins_ids)
-        for u, log in requests:
+        user_ids = user_ids if user_ids else []
+        logins = logins if logins else []
+        all_users_ids = [user_ids[i:i + 100]
+                         for i in range(0, len(user_ids), 100)]
+        all_logins_ids = [logins[i:i + 100]
+                          for i in range(0, len(logins), 100)]
+
+        semaphore = asyncio.Semaphore(
+            concurrency if concurrency else self.max_concurrency,
+            loop=self.loop)
+
+        async def request(params):
+            async with semaphore:
+                return await self.request(route, params=params)
+
+        requests = []
+        for u, log in zip_longest(all_users_ids, all_logins_ids):
             params = MultiDict()
             if u:
                 for user_id in u:
@@ -550,9 +634,9 @@ class HTTPClient:
             if log:
                 for login in log:
                     params.add('login', login)
-            responses.append(await self.request(route, params=params))
+            requests.append(request(params))
 
-        return responses
+        return requests
 
     async def get_user_follows(self, *, from_id=None, to_id=None, after=None,
                                first=None):
@@ -0,0 +1,233 @@
+import re
+from collections.abc import Mapping
+
+TAG_IDENTIFIER = '@'
+TAG_SEPARATOR = ';'
+PREFIX_IDENTIFIER = ':'
+
+# https://ircv3.net/specs/extensions/message-tags#escaping-values
+TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+_TAG_ESCAPE_RE = re.compile(r'\\(.?)', re.DOTALL)
+
+
+class IRCLine:
+    """
+    A single IRC line, split into its parts as defined by
+    https://ircv3.net/specs/extensions/message-tags and
+    https://tools.ietf.org/html/rfc1459#section-2.3.1 ::
+
+        [@tags] [:nick!user@host] <command> [params]* [:trailing]
+
+    ``nick``, ``user`` and ``host`` are ``None`` when the prefix is a
+    server name (e.g. ``:tmi.twitch.tv``), in which case it is
+    available as ``server``.
+    """
+    __slots__ = ('raw', 'tags', 'server', 'nick', 'user', 'host', 'command',
+                 'params', 'trailing')
+
+    def __init__(self, raw, tags, server, nick, user, host, command, params,
+                 trailing):
+        self.raw = raw
+        self.tags = tags
+        self.server = server
+        self.nick = nick
+        self.user = user
+        self.host = host
+        self.command = command
+        self.params = params
+        self.trailing = trailing
+
+    @property
+    def channel_name(self):
+        """
+        The first parameter without the ``#`` prefix, which for every
+        channel command is the channel the command is about.
+        """
+        if not self.params:
+            return None
+        channel_name = self.params[0]
+        return channel_name[1:] if channel_name.startswith('#') else \
+            channel_name
+
+
+def tokenize(line):
+    """
+    Splits a raw IRC line into an :class:`IRCLine` in a single pass. Each
+    part is located with ``str.find`` and sliced out once, the line is
+    never split and joined back together.
+    """
+    pos = 0
+
+    tags = None
+    if line.startswith(TAG_IDENTIFIER):
+        end = line.find(' ')
+        if end == -1:
+            end = len(line)
+        tags = IRCTags(line[1:end]) if end > 1 else None
+        pos = end + 1
+
+    server = nick = user = host = None
+    if line.startswith(PREFIX_IDENTIFIER, pos):
+        end = line.find(' ', pos)
+        if end == -1:
+            end = len(line)
+        prefix = line[pos + 1:end]
+        pos = end + 1
+
+        nick, has_user, user = prefix.partition('!')
+        if has_user:
+            user, has_host, host = user.partition('@')
+        else:
+            nick, has_host, host = nick.partition('@')
+            user = None
+        if not has_user and not has_host:
+            server = prefix
+            nick = host = None
+        elif not has_host:
+            host = None
+
+    trailing = None
+    end = line.find(' :', pos)
+    if end == -1:
+        middle = line[pos:]
+    else:
+        middle = line[pos:end]
+        trailing = line[end + 2:]
+
+    command, _, params = middle.partition(' ')
+    params = params.split() if params else []
+
+    return IRCLine(line, tags, server, nick, user, host, command, params,
+                   trailing)
+
+
+class IRCTags(Mapping):
+    """
+    The tags of an IRC line, as a read-only mapping of tag name to value.
+
+    Nothing is parsed when the line is read. Looking up a key finds the
+    offsets of its value in the raw tags, then unescapes it, and the result
+    is cached. Most handlers only read a few of the tags a line carries.
+
+    As the IRCv3 spec says, a tag without a value maps to ``''`` and when
+    a key is repeated the last value wins.
+    """
+    __slots__ = ('_raw', '_values', '_converted', '_offsets')
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._values = {}
+        self._converted = None
+        self._offsets = None
+
+    def __repr__(self):
+        return f'<IRCTags {self._raw!r}>'
+
+    def __bool__(self):
+        return bool(self._raw)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self._all_offsets())
+
+    def __len__(self):
+        return len(self._all_offsets())
+
+    def get(self, key, default=None):
+        value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if self._offsets is not None:
+            return self._get_parsed(key, default)
+
+        raw = self._raw
+        # values can't contain ';' (it is escaped), so this can only ever
+        # match the start of a tag. The last one is looked for, as the last
+        # of repeated keys wins
+        start = raw.rfind(TAG_SEPARATOR + key)
+        if start != -1:
+            start += len(key) + 1
+        elif raw.startswith(key):
+            start = len(key)
+        else:
+            return default
+
+        if start == len(raw) or raw[start] == TAG_SEPARATOR:
+            # a tag without a value
+            value = ''
+        elif raw[start] != '=':
+            # a longer tag name starting with key, rare enough to just
+            # parse everything
+            return self._get_parsed(key, default)
+        else:
+            start += 1
+            end = raw.find(TAG_SEPARATOR, start)
+            value = raw[start:end] if end != -1 else raw[start:]
+            if '\\' in value:
+                value = unescape_tag_value(value)
+        self._values[key] = value
+        return value
+
+    def get_int(self, key, default=None):
+        """
+        Returns the value of the tag converted to an :class:`int`, or
+        ``default`` if the tag is missing or empty.
+        """
+        if self._converted is None:
+            self._converted = {}
+        value = self._converted.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.get(key)
+            value = int(value) if value else None
+            self._converted[key] = value
+        return default if value is None else value
+
+    def _get_parsed(self, key, default):
+        offsets = self._all_offsets().get(key)
+        if offsets is None:
+            return default
+        start, end = offsets
+        value = unescape_tag_value(self._raw[start:end])
+        self._values[key] = value
+        return value
+
+    def _all_offsets(self):
+        if self._offsets is None:
+            offsets = {}
+            raw = self._raw
+            start = 0
+            length = len(raw)
+            while start < length:
+                end = raw.find(TAG_SEPARATOR, start)
+                if end == -1:
+                    end = length
+                equals = raw.find('=', start, end)
+                if equals == -1:
+                    # a tag without a value
+                    if end > start:
+                        offsets[raw[start:end]] = (end, end)
+                elif equals > start:
+                    offsets[raw[start:equals]] = (equals + 1, end)
+                start = end + 1
+            self._offsets = offsets
+        return self._offsets
+
+
+_MISSING = object()
+
+
+def unescape_tag_value(value):
+    if '\\' not in value:
+        return value
+    # a trailing lone backslash maps to an empty group and is dropped
+    return _TAG_ESCAPE_RE.sub(
+        lambda m: TAG_ESCAPES.get(m.group(1), m.group(1)), value)
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class UserLoader:
+    """
+    Coalesces concurrent user lookups into as few ``/users`` requests as
+    possible.
+
+    Lookups are collected for ``window`` seconds, or until
+    :attr:`MAX_BATCH_SIZE` keys are pending, then sent as a single request.
+    Every caller waiting on the same id or login shares the same future,
+    including callers that arrive while the request is already in flight.
+    """
+    # the /users endpoint accepts up to 100 ids and logins per request
+    MAX_BATCH_SIZE = 100
+
+    def __init__(self, fetch, *, loop, window=0.005):
+        self._fetch = fetch
+        self.loop = loop
+        self.window = window
+        self._batch = []
+        self._in_flight = {}
+        self._handle = None
+
+    def load(self, *, user_id=None, login=None):
+        """
+        Returns a future resolving to the :class:`User` with the user_id or
+        login passed, or ``None`` if it doesn't exist. The future is shared
+        between callers, so it should be shielded before being cancelled.
+        """
+        key = ('id', int(user_id)) if user_id else ('login', login.lower())
+        future = self._in_flight.get(key)
+        if future is not None:
+            return future
+
+        future = self.loop.create_future()
+        self._in_flight[key] = future
+        self._batch.append(key)
+
+        if len(self._batch) >= UserLoader.MAX_BATCH_SIZE:
+            self._dispatch()
+        elif self._handle is None:
+            self._handle = self.loop.call_later(self.window, self._dispatch)
+        return future
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        batch, self._batch = self._batch, []
+        if batch:
+            self.loop.create_task(self._load_batch(batch))
+
+    async def _load_batch(self, batch):
+        user_ids = [value for kind, value in batch if kind == 'id']
+        logins = [value for kind, value in batch if kind == 'login']
+        log.debug(f'loading {len(user_ids)} user ids and {len(logins)} '
+                  f'logins in a single batch')
+
+        try:
+            users = await self._fetch(user_ids=user_ids, logins=logins)
+            by_id = {user.id: user for user in users}
+            by_login = {user.login.lower(): user for user in users}
+            for kind, value in batch:
+                future = self._in_flight.get((kind, value))
+                if future is None or future.done():
+                    continue
+                lookup = by_id if kind == 'id' else by_login
+                future.set_result(lookup.get(value))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            for key in batch:
+                future = self._in_flight.get(key)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        finally:
+            # also reached when the task is cancelled, e.g. by Client.close,
+            # the callers must not be left waiting on a future nobody sets
+            for key in batch:
+                future = self._in_flight.pop(key, None)
+                if future is not None and not future.done():
+                    future.cancel()
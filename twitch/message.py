@@ -4,6 +4,9 @@ from .tags import Tags, Emote
 
 
 class Message:
+    __slots__ = ('_content', '_author', '_channel', '_session', '_emotes',
+                 '_id', '_time_sent')
+
     def __init__(self, content, user, channel, *, session, tags_data):
         self._content = content
         self._author = user
@@ -49,6 +52,48 @@ class Message:
     def emotes(self):
         return self._emotes
 
+    def emote_spans(self):
+        """
+        Returns the ``(start, end, emote)`` of every emote occurrence in the
+        message, ordered by position, ``end`` excluded.
+        """
+        if not self._emotes:
+            return []
+        spans = []
+        for emote in self._emotes:
+            positions = emote._spans
+            for i in range(0, len(positions), 2):
+                spans.append((positions[i], positions[i + 1], emote))
+        spans.sort(key=lambda span: span[0])
+        return spans
+
+    def segments(self):
+        """
+        Yields the message content split into ``(text, emote)`` pairs, in
+        order. ``emote`` is ``None`` for the text between emotes. Spans that
+        overlap or run past the content are skipped.
+        """
+        content = self._content
+        position = 0
+        for start, end, emote in self.emote_spans():
+            if start < position or end > len(content):
+                continue
+            if start > position:
+                yield content[position:start], None
+            yield content[start:end], emote
+            position = end
+        if position < len(content):
+            yield content[position:], None
+
+    def strip_emotes(self):
+        """
+        Returns the content of the message without its emotes.
+        """
+        if not self._emotes:
+            return self._content
+        return ''.join(text for text, emote in self.segments()
+                       if emote is None)
+
     @property
     def id(self):
         return self._id
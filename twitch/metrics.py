@@ -0,0 +1,134 @@
+import time
+from bisect import bisect_left
+
+
+class Stage:
+    """
+    The stages a received message goes through, timed by :class:`Metrics`
+    """
+    RECV = 'recv'  #: from the frame being read to it being queued
+    QUEUE_WAIT = 'queue_wait'  #: time spent in the ingress or listener queues
+    PARSE = 'parse'  #: parsing a frame, including the lookups it awaits
+    MODEL_BUILD = 'model_build'  #: building the models passed to events
+    HTTP_LOOKUP = 'http_lookup'  #: a Helix request, retries included
+    HANDLER_RUN = 'handler_run'  #: running an event listener
+
+
+# in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    A histogram with fixed bucket upper bounds. Observing a value is a
+    binary search and an increment, nothing is allocated.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # the last count is for values above the highest bound
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def observe(self, value):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def cumulative_counts(self):
+        """
+        Returns ``(upper bound, count of values <= bound)`` pairs, ending
+        with ``float('inf')``, as Prometheus expects them.
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                self._counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self):
+        return {'count': self._count, 'sum': self._sum,
+                'buckets': dict(self.cumulative_counts())}
+
+
+class Metrics:
+    """
+    Per-:class:`Stage` latency histograms of a :class:`Client`.
+
+    When disabled, :meth:`start` returns ``None`` and :meth:`observe`
+    returns straight away, so the instrumented code paths only pay for two
+    method calls.
+
+    Parameters
+    -----------
+
+    enabled: Optional[:class:`bool`]
+        Whether timings are recorded. Defaults to ``False``
+    buckets: Optional[Sequence[:class:`float`]]
+        The upper bounds, in seconds, of the histogram buckets.
+    """
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms = {}
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = Histogram(self.buckets)
+            self._histograms[stage] = histogram
+        return histogram
+
+    def start(self):
+        """
+        Returns the time to pass to :meth:`observe` once the stage is over,
+        or ``None`` when disabled.
+        """
+        return time.perf_counter() if self.enabled else None
+
+    def observe(self, stage, start):
+        if start is None:
+            return
+        self.histogram(stage).observe(time.perf_counter() - start)
+
+    def observe_duration(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def reset(self):
+        self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns the histograms as a :class:`dict` of stage name to its
+        ``count``, ``sum`` and cumulative ``buckets``.
+        """
+        return {stage: histogram.snapshot()
+                for stage, histogram in self._histograms.items()}
+
+    def to_prometheus(self, name='twitch_stage_seconds'):
+        """
+        Returns the histograms in the Prometheus text exposition format,
+        as a single metric labelled by stage.
+        """
+        lines = [f'# HELP {name} Time spent per message processing stage.',
+                 f'# TYPE {name} histogram']
+        for stage, histogram in sorted(self._histograms.items()):
+            for bound, count in histogram.cumulative_counts():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
@@ -3,31 +3,37 @@ from datetime import timedelta
 
 from .opcodes import OpCode
 from .events import Event
-from .exception import WebSocketLoginFailure
+from .exception import WebSocketLoginFailure, ChannelJoinFailure
 from .utils import split_skip_empty_parts
 from .message import Message
-from .channel import Channel
+from .user import User
 from .tags import Tags
-from.capability import Capability, CapabilityConfig
+from .capability import CapabilityConfig
+from .irc import tokenize
+from .metrics import Stage
 
 LF = '\n'
 CRLF = '\r' + LF
 
 CHANNEL_PREFIX = '#'
-TAG_IDENTIFIER = '@'
-TAG_SEPARATOR = ';'
 
 TMI_URL = 'tmi.twitch.tv'
+TMI_PONG = f':{TMI_URL} PONG '
 BASE_URL = 'twitch.tv'
 
 TAGS_CAPABILITY = f'{BASE_URL}/tags'
 MEMBERSHIP_CAPABILITY = f'{BASE_URL}/membership'
 COMMANDS_CAPABILITY = f'{BASE_URL}/commands'
-CHAT_ROOMS_CAPABILITY = f':{TAGS_CAPABILITY} {COMMANDS_CAPABILITY}'
+CHAT_ROOMS_CAPABILITY = f'{TAGS_CAPABILITY} {COMMANDS_CAPABILITY}'
 
-CAPABILITY_ACK_PREFIX = f':{TMI_URL} {OpCode.CAP} * {OpCode.ACK}'
+# the NOTICE msg-ids Twitch answers a JOIN it refuses with, instead of a
+# JOIN and ROOMSTATE
+JOIN_FAILURE_NOTICES = {
+    'msg_channel_suspended', 'msg_room_not_found', 'tos_ban'
+}
 
-NAMES_LIST_END = ':End of /NAMES list'
+NAMES_REPLY = '353'
+NAMES_LIST_END = '366'
 
 GLHF_PARTS = [
     ('001', ':Welcome, GLHF!'),
@@ -55,6 +61,23 @@ class MessageParserHandler:
         self._message_handled = True
         self._ws._emit(event, *args)
 
+    async def _get_user(self, *, login=None, user_id=None, tags_dict=None):
+        session = self._ws._session
+        if session.partial_users:
+            if not login:
+                return None
+            start = session.metrics.start()
+            user = User.from_tags(login, tags_dict, session=session)
+            session.metrics.observe(Stage.MODEL_BUILD, start)
+            return user
+
+        if not login and not user_id:
+            return None
+        user = await session.get_user(user_id=user_id, login=login)
+        if user:
+            user.add_tags_data(tags_dict)
+        return user
+
     @staticmethod
     async def parse_irc_message(msg, ws):
         # IRC spec (https://tools.ietf.org/html/rfc2812)
@@ -85,138 +108,208 @@ class SingleLineMessageParser(MessageParserHandler, IMessageParser):
         return self._tags_data
 
     async def parse(self, msg):
-        self._message_handled = False
+        return await self.parse_line(tokenize(msg))
 
-        have_tags = msg.startswith(TAG_IDENTIFIER)
-        tags_dict, remaining_msg = _parse_whole_msg(msg, have_tags)
-        msg = remaining_msg
-
-        self._tags_data = tags_dict
-
-        if OpCode.PING in msg:
-            self.emit(Event.PINGED)
-            await self._ws.send_pong()
-        elif OpCode.NOTICE in msg:
-            if msg.endswith('Login authentication failed'):
-                raise WebSocketLoginFailure(
-                    'login authentication failed. ensure the username and '
-                    'access token is valid')
-
-        elif OpCode.MODE in msg:
-            msg_parts = split_skip_empty_parts(msg)
-            if len(msg_parts) == 5:
-                channel_name = msg_parts[2]
-                gained = '+' in msg_parts[3]
-                username = msg_parts[4]
-                user = await self._ws._session.get_user(login=username)
-                self.emit(Event.MOD_STATUS_CHANGED, user, channel_name,
-                          gained)
-
-        elif CAPABILITY_ACK_PREFIX in msg:
-            capability = _get_capability_ack_single(msg)
-            if not capability:
-                return
-            if capability == Capability.TAGS:
-                self.emit(Event.TAG_REQUEST_ACKED)
-            elif capability == Capability.MEMBERSHIP:
-                self.emit(Event.MEMBERSHIP_REQUEST_ACKED)
-            elif capability == Capability.COMMANDS:
-                self.emit(Event.COMMANDS_REQUEST_ACKED)
-            elif capability == Capability.CHAT_ROOMS:
-                self.emit(Event.CHAT_ROOMS_REQUEST_ACKED)
-
-        elif OpCode.GLOBALUSERSTATE in msg:
-            user_id = tags_dict.get(Tags.USER_ID)
-            user = await self._ws._session.get_user(user_id=user_id)
-            user.add_tags_data(tags_dict)
-            self.emit(Event.GLOBAL_USERSTATE_RECEIVED, user)
+    async def parse_line(self, line):
+        self._message_handled = False
+        self._tags_data = line.tags
 
+        handler = SingleLineMessageParser._HANDLERS.get(line.command)
+        if handler:
+            await handler(self, line)
         else:
-            """
-            msg format is always this for these OpCode:
-
-            [options tags]* :[<user>!<user>@<user>.]tmi.twitch.tv <opcode>
-            #<channel> [optional args]*
-            """
-            msg_parts = split_skip_empty_parts(msg)
-            if not msg_parts:
-                return False
-
-            msg_dict = _parse_msg(msg_parts)
-            if msg_dict:
-                opcode = msg_dict['opcode']
-                channel_name = msg_dict['channel_name']
-                username = msg_dict['username']
-
-                user = await self._ws._session.get_user(login=username)
-                if user:
-                    user.add_tags_data(tags_dict)
-                channel = Channel(channel_name,
-                                  session=self._ws._session,
-                                  tags_data=tags_dict)
-
-                if opcode == OpCode.PRIVMSG:
-                    content = _get_args(msg_dict)
-                    if content:
-                        text = ' '.join(content).lstrip(':')
-                        message = Message(text, user, channel,
-                                          session=self._ws._session,
-                                          tags_data=tags_dict)
-                        self.emit(Event.MESSAGE, message)
-
-                elif opcode == OpCode.CLEARCHAT:
-                    banned_user = _get_args(msg_dict)
-                    if banned_user:
-                        banned_user = banned_user[0].lstrip(':')
-                        banned_user = await self._ws._session.get_user(
-                            login=banned_user)
-
-                    if Tags.BAN_DURATION in tags_dict:
-                        delta = timedelta(
-                            seconds=int(tags_dict[Tags.BAN_DURATION]))
-                        self.emit(Event.USER_BANNED, banned_user, delta)
-                    else:
-                        if banned_user:
-                            self.emit(Event.USER_PERMANENT_BANNED, banned_user)
-                        else:
-                            self.emit(Event.CHAT_CLEARED, channel)
-
-                elif opcode == OpCode.CLEARMSG:
-                    try:
-                        username = tags_dict[Tags.LOGIN]
-                        content = _get_args(msg_dict)[0]
-
-                        user = await self._ws._session.get_user(login=username)
-                        message = Message(content, user, content,
-                                          session=self._ws._session,
-                                          tags_data=tags_dict)
-                        self.emit(Event.MESSAGE_CLEARED, message)
-                    except (KeyError, IndexError):
-                        # meh
-                        pass
-
-                elif opcode == OpCode.ROOMSTATE:
-                    self.emit(Event.ROOMSTATE_RECEIVED, channel)
-
-                elif opcode == OpCode.USERSTATE:
-                    self.emit(Event.USER_JOIN_CHANNEL, user, channel)
-
-                elif opcode == OpCode.JOIN:
-                    self.emit(Event.USER_JOIN_CHANNEL, user, channel)
-
-                elif opcode == OpCode.PART:
-                    self.emit(Event.USER_LEFT_CHANNEL, user, channel)
-
-                elif opcode == OpCode.USERNOTICE:
-                    # TODO: handle this at some point,
-                    #  can't be bothered right now
-                    pass
-
-                else:
-                    self.emit(Event.UNKNOWN, msg)
+            self.emit(Event.UNKNOWN, line.raw)
 
         return self._message_handled
 
+    async def _handle_ping(self, line):
+        self.emit(Event.PINGED)
+        await self._ws.send_pong()
+
+    async def _handle_pong(self, line):
+        # the answer to a heartbeat sent by WebSocketClient.heartbeat
+        self._message_handled = True
+        self._ws._on_pong(line.trailing)
+
+    async def _handle_notice(self, line):
+        if line.trailing == 'Login authentication failed':
+            raise WebSocketLoginFailure(
+                'login authentication failed. ensure the username and '
+                'access token is valid')
+
+        msg_id = line.tags.get(Tags.MSG_ID) if line.tags else None
+        channel_name = line.channel_name
+        if msg_id in JOIN_FAILURE_NOTICES and channel_name:
+            self._ws._session._fail_join(
+                channel_name,
+                ChannelJoinFailure(channel_name, msg_id, line.trailing))
+
+    async def _handle_mode(self, line):
+        if len(line.params) == 3:
+            channel_name, mode, username = line.params
+            gained = '+' in mode
+            if username == self._ws.username:
+                self._ws._send_limits.set_moderator(
+                    channel_name.lstrip(CHANNEL_PREFIX), gained)
+            user = await self._get_user(login=username)
+            self.emit(Event.MOD_STATUS_CHANGED, user, channel_name, gained)
+
+    async def _handle_cap(self, line):
+        if len(line.params) < 2 or line.params[1] != OpCode.ACK:
+            return
+
+        cap_config = _get_capability_ack(line.trailing)
+        if cap_config.tags:
+            self.emit(Event.TAG_REQUEST_ACKED)
+        if cap_config.membership:
+            self.emit(Event.MEMBERSHIP_REQUEST_ACKED)
+        if cap_config.commands:
+            self.emit(Event.COMMANDS_REQUEST_ACKED)
+        if cap_config.chat_rooms:
+            # although the doc says chat rooms doesn't have an ack, it
+            # actually does...
+            self.emit(Event.CHAT_ROOMS_REQUEST_ACKED)
+
+    async def _handle_global_userstate(self, line):
+        tags_dict = line.tags
+        user_id = tags_dict.get(Tags.USER_ID) if tags_dict else None
+        user = await self._get_user(login=self._ws.username,
+                                    user_id=user_id,
+                                    tags_dict=tags_dict)
+        self.emit(Event.GLOBAL_USERSTATE_RECEIVED, user)
+
+    async def _handle_channel_command(self, line):
+        """
+        line format is always this for these commands:
+
+        [options tags]* :[<user>!<user>@<user>.]tmi.twitch.tv <command>
+        #<channel> [optional args]*
+        """
+        channel_name = line.channel_name
+        if not channel_name:
+            return
+
+        if line.command == OpCode.USERSTATE:
+            # USERSTATE is always about the client's own user and
+            # doesn't carry a user prefix
+            username = self._ws.username
+        else:
+            username = line.nick
+
+        # lines of channels we didn't join, e.g. the ones still arriving
+        # after our own PART, are dropped, only our own JOIN and ROOMSTATE
+        # may add a channel that isn't being joined
+        own = line.command == OpCode.ROOMSTATE or \
+            (line.command == OpCode.JOIN and username == self._ws.username)
+        channel = self._ws._session._get_known_channel(channel_name,
+                                                       create=own)
+        if channel is None:
+            return
+
+        user = await self._get_user(login=username, tags_dict=line.tags)
+        if channel.id is None and line.tags:
+            room_id = line.tags.get_int(Tags.ROOM_ID)
+            if room_id:
+                channel._id = room_id
+
+        handler = SingleLineMessageParser._CHANNEL_HANDLERS[line.command]
+        await handler(self, line, user, channel)
+
+    async def _handle_privmsg(self, line, user, channel):
+        text = line.trailing if line.trailing is not None else \
+            ' '.join(line.params[1:])
+        if text:
+            metrics = self._ws._session.metrics
+            start = metrics.start()
+            message = Message(text, user, channel,
+                              session=self._ws._session,
+                              tags_data=line.tags)
+            metrics.observe(Stage.MODEL_BUILD, start)
+            self.emit(Event.MESSAGE, message)
+
+    async def _handle_clearchat(self, line, user, channel):
+        tags_dict = line.tags
+        banned_user = line.trailing
+        if banned_user:
+            banned_user = await self._get_user(login=banned_user)
+
+        duration = tags_dict.get_int(Tags.BAN_DURATION) if tags_dict \
+            else None
+        if duration is not None:
+            delta = timedelta(seconds=duration)
+            self.emit(Event.USER_BANNED, banned_user, delta)
+        else:
+            if banned_user:
+                self.emit(Event.USER_PERMANENT_BANNED, banned_user)
+            else:
+                self.emit(Event.CHAT_CLEARED, channel)
+
+    async def _handle_clearmsg(self, line, user, channel):
+        tags_dict = line.tags
+        username = tags_dict.get(Tags.LOGIN) if tags_dict else None
+        if not username or line.trailing is None:
+            return
+
+        user = await self._get_user(login=username)
+        message = Message(line.trailing, user, channel,
+                          session=self._ws._session,
+                          tags_data=tags_dict)
+        self.emit(Event.MESSAGE_CLEARED, message)
+
+    async def _handle_roomstate(self, line, user, channel):
+        tags_dict = line.tags
+        # only the first ROOMSTATE after joining carries every setting,
+        # later ones only carry the setting that changed
+        channel._update_tags(tags_dict)
+        self._ws._session._confirm_join(channel)
+        slow = tags_dict.get_int(Tags.SLOW) if tags_dict else None
+        if slow is not None:
+            self._ws._send_limits.set_slow(channel.name, slow)
+        self.emit(Event.ROOMSTATE_RECEIVED, channel)
+
+    async def _handle_userstate(self, line, user, channel):
+        self._ws._send_limits.set_moderator(
+            channel.name, _is_moderator(line.tags))
+        self.emit(Event.USER_JOIN_CHANNEL, user, channel)
+
+    async def _handle_join(self, line, user, channel):
+        if line.nick == self._ws.username:
+            self._ws._session._confirm_join(channel)
+        self.emit(Event.USER_JOIN_CHANNEL, user, channel)
+
+    async def _handle_part(self, line, user, channel):
+        if line.nick == self._ws.username:
+            self._ws._session._remove_channel(channel.name)
+            self._ws._send_limits.forget(channel.name)
+            self._ws._session._confirm_part(channel)
+        self.emit(Event.USER_LEFT_CHANNEL, user, channel)
+
+    async def _handle_usernotice(self, line, user, channel):
+        # TODO: handle this at some point,
+        #  can't be bothered right now
+        pass
+
+    _CHANNEL_HANDLERS = {
+        OpCode.PRIVMSG: _handle_privmsg,
+        OpCode.CLEARCHAT: _handle_clearchat,
+        OpCode.CLEARMSG: _handle_clearmsg,
+        OpCode.ROOMSTATE: _handle_roomstate,
+        OpCode.USERSTATE: _handle_userstate,
+        OpCode.JOIN: _handle_join,
+        OpCode.PART: _handle_part,
+        OpCode.USERNOTICE: _handle_usernotice,
+    }
+
+    _HANDLERS = {
+        OpCode.PING: _handle_ping,
+        OpCode.PONG: _handle_pong,
+        OpCode.NOTICE: _handle_notice,
+        OpCode.MODE: _handle_mode,
+        OpCode.CAP: _handle_cap,
+        OpCode.GLOBALUSERSTATE: _handle_global_userstate,
+        **dict.fromkeys(_CHANNEL_HANDLERS, _handle_channel_command)
+    }
+
 
 class MultiLineMessageParser(MessageParserHandler, IMessageParser):
     def __init__(self, *, ws):
@@ -226,48 +319,31 @@ class MultiLineMessageParser(MessageParserHandler, IMessageParser):
     async def parse(self, msg_parts):
         self._message_handled = False
 
-        cap_ack = all([CAPABILITY_ACK_PREFIX in msg for msg in msg_parts])
-
-        if cap_ack:
-            cap_config = _get_capability_ack_multi(msg_parts)
-            if cap_config.tags:
-                self.emit(Event.TAG_REQUEST_ACKED)
-            if cap_config.membership:
-                self.emit(Event.MEMBERSHIP_REQUEST_ACKED)
-            if cap_config.commands:
-                self.emit(Event.COMMANDS_REQUEST_ACKED)
-            if cap_config.chat_rooms:
-                # although the doc says chat rooms doesn't have an ack, it
-                # actually does...
-                self.emit(Event.CHAT_ROOMS_REQUEST_ACKED)
-        else:
-            usernames = []
-            channel = None
-            for message in msg_parts:
-                if any(
-                        [getattr(OpCode, opcode) in message for opcode in
-                         OpCode._fields]):
-                    self._message_handled = await self._sl_parser.parse(
-                        message)
-                else:
-                    # We must have received part of a /NAMES list
-                    if NAMES_LIST_END not in message:
-                        usernames += _parse_names(message)
-                    else:
-                        final_line_parts = split_skip_empty_parts(message)
-                        channel_name = final_line_parts[3].lstrip(
-                            CHANNEL_PREFIX) if len(
-                            final_line_parts) == 8 else None
-
-                        if channel_name:
-                            channel = \
-                                Channel(channel_name,
-                                        session=self._ws._session,
-                                        tags_data=self._sl_parser.tags_data)
-
-            if usernames and channel:
-                users = await self._ws._session.get_users(logins=usernames)
-                self.emit(Event.LIST_USERS, users, channel)
+        usernames = []
+        channel = None
+        for message in msg_parts:
+            line = tokenize(message)
+            if line.command == NAMES_REPLY:
+                # We must have received part of a /NAMES list
+                if line.trailing:
+                    usernames += line.trailing.split()
+            elif line.command == NAMES_LIST_END:
+                if len(line.params) == 2:
+                    channel_name = line.params[1].lstrip(CHANNEL_PREFIX)
+                    channel = self._ws._session._get_known_channel(
+                        channel_name)
+            else:
+                handled = await self._sl_parser.parse_line(line)
+                self._message_handled = self._message_handled or handled
+
+        if usernames and channel:
+            session = self._ws._session
+            if session.partial_users:
+                users = [User.from_tags(username, None, session=session)
+                         for username in usernames]
+            else:
+                users = await session.get_users(logins=usernames)
+            self.emit(Event.LIST_USERS, users, channel)
 
         return self._message_handled
 
@@ -277,89 +353,19 @@ def _handle_glhf(msg_parts, ws):
     return None if msg_parts == glhf else msg_parts
 
 
-def _get_args(msg_dict):
-    if 'args' in msg_dict:
-        return msg_dict['args']
-    return None
-
-
-def _parse_whole_msg(msg, have_tags):
-    tags_dict = None
-    if have_tags:
-        tags_msg = msg.lstrip(TAG_IDENTIFIER)
-        tags_msg = tags_msg.split(' ', 1)[0]
-        tags_dict = _parse_tags(tags_msg)
-    non_tags_msg = msg.split(' ', 1)
-    remaining_msg = ' '.join(non_tags_msg) if not have_tags else non_tags_msg[
-        1]
-    return tags_dict, remaining_msg
-
-
-def _parse_msg(msg_parts):
-    msg_dict = {}
-    num_parts = len(msg_parts)
-    if num_parts > 2:
-        msg_dict['username'] = _parse_tmi(msg_parts[0])
-        msg_dict['opcode'] = msg_parts[1]
-        msg_dict['channel_name'] = msg_parts[2].lstrip(CHANNEL_PREFIX)
-    if num_parts > 3:
-        msg_dict['args'] = msg_parts[3:]
-    return msg_dict
-
-
-def _parse_tmi(tmi):
-    tmi_suffix = f'.{TMI_URL}'
-    if tmi.endswith(tmi_suffix):
-        tmi_len = len(tmi_suffix)
-        user_str = tmi[:-tmi_len]
-        user_parts = user_str.split('@')
-        if len(user_parts) == 2:
-            return user_parts[1]
-    return None
-
-
-def _parse_names(name_msg):
-    msg_parts = split_skip_empty_parts(name_msg, ':')
-    if len(msg_parts) == 2:
-        names = msg_parts[1]
-        return split_skip_empty_parts(names)
-
-
-def _parse_tags(tags_msg):
-    if not tags_msg:
-        return None
-
-    tag_parts = [tag_part.split('=') for tag_part in
-                 split_skip_empty_parts(tags_msg, TAG_SEPARATOR)]
-
-    tags_dict = {kv[0]: kv[1] for kv in tag_parts if len(kv) == 2}
-    return tags_dict
-
-
-def _get_capability_ack_single(msg):
-    if msg.endswith(f':{TAGS_CAPABILITY}'):
-        return Capability.TAGS
-    elif msg.endswith(f':{MEMBERSHIP_CAPABILITY}'):
-        return Capability.MEMBERSHIP
-    elif msg.endswith(f':{COMMANDS_CAPABILITY}'):
-        return Capability.COMMANDS
-    elif msg.endswith(f'{CHAT_ROOMS_CAPABILITY}'):
-        return Capability.CHAT_ROOMS
-    return None
-
-
-def _get_capability_ack_multi(msg_parts):
-    tags = any(
-        [msg.endswith(f':{TAGS_CAPABILITY}') for msg in msg_parts]
-    )
-    membership = any(
-        [msg.endswith(f':{MEMBERSHIP_CAPABILITY}') for msg in msg_parts]
-    )
-    commands = any(
-        [msg.endswith(f':{COMMANDS_CAPABILITY}') for msg in msg_parts]
-    )
-    chat_rooms = any(
-        [msg.endswith(f'{CHAT_ROOMS_CAPABILITY}') for msg in msg_parts]
-    )
-
-    return CapabilityConfig(tags, membership, commands, chat_rooms)
+def _is_moderator(tags_dict):
+    if not tags_dict:
+        return False
+    if tags_dict.get(Tags.MOD) == '1':
+        return True
+    # the broadcaster isn't flagged as a mod, but has the same privileges
+    badges = tags_dict.get(Tags.BADGES)
+    return bool(badges) and 'broadcaster/' in badges
+
+
+def _get_capability_ack(capabilities):
+    acked = capabilities.split() if capabilities else []
+    return CapabilityConfig(TAGS_CAPABILITY in acked,
+                            MEMBERSHIP_CAPABILITY in acked,
+                            COMMANDS_CAPABILITY in acked,
+                            capabilities == CHAT_ROOMS_CAPABILITY)
@@ -1,13 +1,12 @@
 import sys
 import traceback
-import shlex
 import logging
 import asyncio
 from inspect import signature
 from functools import partial
 
 import twitch
-from .commands import CommandParser, FuzzyMatch
+from .commands import CommandPlan, FuzzyMatch, split_command
 
 log = logging.getLogger(__name__)
 
@@ -16,8 +15,12 @@ class Bot(twitch.Client):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.command_prefix = kwargs.get('command_prefix', '!')
-        self.channels = kwargs.get('channels', None)
+        # Client.channels is the registry of joined channels, these are only
+        # the ones to join once connected
+        self.initial_channels = kwargs.get('channels', None)
         self._commands = {}
+        # whether a misspelled command name could still invoke a command
+        self._fuzzy_commands = False
         self._registered_types = {}
 
         # auto register some MESSAGE events for command parser
@@ -25,7 +28,8 @@ class Bot(twitch.Client):
         self.event_handler.register(twitch.Event.MESSAGE, process_commands)
 
         # auto register CONNECTED events for auto-joining channels
-        self.event_handler.register(twitch.Event.CONNECTED, self.join_channels)
+        self.event_handler.register(twitch.Event.CONNECTED,
+                                    self._join_initial_channels)
 
     def command(self, **kwargs):
         def decorator(bot):
@@ -43,7 +47,10 @@ class Bot(twitch.Client):
                         f'{coro.__name__} '
                         f'must be a coroutine function to be a command')
                 else:
-                    bot._commands[command_name] = (coro, pass_ctx, fuzzy_match)
+                    plan = CommandPlan(coro, pass_ctx, bot._registered_types)
+                    bot._commands[command_name] = (plan, fuzzy_match)
+                    if fuzzy_match.enabled:
+                        bot._fuzzy_commands = True
 
             return wrapper
         return decorator(self)
@@ -75,15 +82,20 @@ class Bot(twitch.Client):
 
                 # type successfully registered
                 bot._registered_types[type] = func
+                for plan, _ in bot._commands.values():
+                    plan.resolve(bot._registered_types)
             return wrapper
         return decorator(self)
 
-    async def join_channels(self, user):
-        if not self.channels:
+    async def _join_initial_channels(self, user):
+        if not self.initial_channels:
             return
-        for channel in self.channels:
-            log.info(f'attemping to join {channel}s channel...')
-            await self.join_channel(channel)
+        # after a reconnect, the client rejoins the channels by itself
+        channels = [channel for channel in self.initial_channels
+                    if self.get_channel(channel) is None]
+        if channels:
+            log.info(f'attemping to join {len(channels)} channels...')
+            await self.join_channels(channels, wait=False)
 
     async def process_commands(self, message, _ctor=False):
         if not _ctor:
@@ -91,12 +103,13 @@ class Bot(twitch.Client):
         try:
             content = message.content
             if content.startswith(self.command_prefix):
-                parts = shlex.split(content)
-
-                command_name = parts[0].lstrip(
-                    self.command_prefix) if parts else None
-
-                command_params = parts[1:] if len(parts) > 1 else None
+                # the arguments are only split once the command is found
+                command_name, command_params = split_command(
+                    content, self.command_prefix)
+                if command_name not in self._commands and \
+                        not self._fuzzy_commands:
+                    log.info('%s is not a registered command', command_name)
+                    return
 
                 await self.invoke_command(command_name, command_params,
                                           message)
@@ -106,36 +119,26 @@ class Bot(twitch.Client):
             traceback.print_tb(tb, file=sys.stdout)
 
     async def invoke_command(self, name, params, message):
-        command, pass_ctx, _ = self._commands.get(name, (None, False,
-                                                         FuzzyMatch()))
-        if command:
-            await self._invoke_command(command, pass_ctx, params, message)
+        plan, _ = self._commands.get(name, (None, None))
+        if plan:
+            await plan.invoke(params, message)
             return
         elif FuzzyMatch.HAS_FUZZYWUZZY:
             best_match = self._fuzzy_match_command(name)
             if best_match:
                 try:
-                    command, pass_ctx, _ = self._commands[best_match]
-                    await self._invoke_command(command, pass_ctx, params,
-                                               message)
+                    plan, _ = self._commands[best_match]
+                    await plan.invoke(params, message)
                     return
                 except KeyError:
                     pass
 
         log.info(f'{name} is not a registered command')
 
-    async def _invoke_command(self, command, pass_ctx, params, message):
-        sig = signature(command)
-        sig_params = list(sig.parameters.values())
-        command_parser = CommandParser(command, self._registered_types,
-                                       pass_ctx, params,
-                                       sig_params, message)
-        await command_parser.invoke()
-
     def _fuzzy_match_command(self, name):
         matched_commands = {}
         for command in self._commands.items():
-            command_name, (_,  _, fuzzy_matcher) = command
+            command_name, (_, fuzzy_matcher) = command
             ratio = fuzzy_matcher.match(name, command_name)
             if ratio >= fuzzy_matcher.threshold:
                 matched_commands[command_name] = ratio
@@ -1,7 +1,7 @@
 import logging
 import asyncio
 import enum
-from inspect import Parameter
+from inspect import Parameter, signature
 
 from . import context
 
@@ -38,6 +38,13 @@ class FuzzyMatch:
     def threshold(self):
         return self._threshold
 
+    @property
+    def enabled(self):
+        """
+        Whether the matcher can ever match a misspelled command.
+        """
+        return self._ratio != FuzzyRatio.NONE and FuzzyMatch.HAS_FUZZYWUZZY
+
     def match(self, user_command, registered_command):
         if self._ratio == FuzzyRatio.SIMPLE:
             return self._match_simple(user_command, registered_command)
@@ -66,169 +73,213 @@ class FuzzyMatch:
                                     self._force_ascii, self._full_process)
 
 
-class CommandParser:
-    def __init__(self, command, registered_types, pass_ctx, cmd_params,
-                 sig_params, message):
-        self.registered_types = registered_types
-        self.cmd_params = cmd_params
-        self.sig_params = sig_params
-        self.ctx = context.Context(message) if pass_ctx else None
-        self.name = command.__name__
+def split_command(content, prefix):
+    """
+    Returns the name of the command in a message starting with ``prefix``,
+    and the rest of the message, left as is until the arguments are needed.
+    """
+    parts = content.split(None, 1)
+    if not parts:
+        return None, ''
+    name = parts[0].lstrip(prefix)
+    return name, parts[1] if len(parts) > 1 else ''
+
+
+def split_arguments(text):
+    """
+    Splits command arguments like :func:`shlex.split`: single or double
+    quotes group words and a backslash escapes the next character. Unlike
+    shlex, quotes only start a group at the beginning of an argument, so
+    words like ``don't`` are kept as typed, and an unclosed quote isn't an
+    error, it runs to the end of the text.
+    """
+    if '"' not in text and "'" not in text and '\\' not in text:
+        return text.split()
+
+    args = []
+    current = []
+    in_arg = False
+    quote = None
+    chars = iter(text)
+    for char in chars:
+        if quote:
+            if char == quote:
+                quote = None
+            elif char == '\\' and quote == '"':
+                # like a shell, only \\ and \" are escapes in double quotes
+                escaped = next(chars, '')
+                if escaped not in ('\\', '"'):
+                    current.append(char)
+                current.append(escaped)
+            else:
+                current.append(char)
+        elif (char == '"' or char == "'") and not in_arg:
+            quote = char
+            in_arg = True
+        elif char == '\\':
+            current.append(next(chars, ''))
+            in_arg = True
+        elif char.isspace():
+            if in_arg:
+                args.append(''.join(current))
+                current = []
+                in_arg = False
+        else:
+            current.append(char)
+            in_arg = True
+    if in_arg:
+        args.append(''.join(current))
+    return args
+
+
+# how a plan calls its command for a given amount of message parameters
+_ARGS = 0
+_KWARGS = 1
+
+_UNSUPPORTED_KIND = 'the parameter kind for the commands parameters isn\'t ' \
+                    'supported'
+_MIXED_KINDS = 'the parameter kind for all the commands parameters must' \
+               'be the same'
+
+
+class CommandPlan:
+    """
+    How to invoke a command, worked out once from its signature when the
+    command is registered: the converter of every parameter, how the
+    parameters are passed depending on how many the message has, and
+    whether a :class:`Context` goes first. Invoking a command then only
+    converts the message parameters.
+    """
+    def __init__(self, command, pass_ctx, registered_types):
         self.command = command
+        self.name = command.__name__
+        self.pass_ctx = pass_ctx
 
-        if self.sig_params and pass_ctx:
+        params = list(signature(command).parameters.values())
+        if params and pass_ctx:
             # we don't want to parse the context object as it always invoked
             # as the first parameter and doesnt depend on the command params
-            self.sig_params.pop(0)
+            params.pop(0)
+        self.params = params
+        self.names = [param.name for param in params]
+        self.arity = len(params)
+
+        kinds = {param.kind for param in params}
+        kind = params[0].kind if len(kinds) == 1 else None
+        self.kind = kind
+        # what to do with more, as many, or less message parameters than
+        # the signature has. Either _ARGS, _KWARGS or a message to log
+        if kind in (Parameter.VAR_POSITIONAL,
+                    Parameter.POSITIONAL_OR_KEYWORD):
+            self._more = self._equal = _ARGS
+            self._less = _ARGS if kind == Parameter.VAR_POSITIONAL else \
+                'can\'t invoke a command with less message parameters ' \
+                'than the signature requires'
+        elif kind == Parameter.KEYWORD_ONLY:
+            self._more = self._equal = _KWARGS
+            self._less = 'can\'t build **kwargs with less message ' \
+                         'parameters than command signature params'
+        else:
+            self._more = self._equal = self._less = _UNSUPPORTED_KIND
 
-    async def _invoke(self, coro, *args, **kwargs):
-        try:
-            await coro(*args, **kwargs)
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            try:
-                log.info(
-                    f'{self.name} raised an exception: {str(e)}')
-            except asyncio.CancelledError:
-                pass
+        self.converters = []
+        self.resolve(registered_types)
 
-    async def _invoke_kwargs(self, coro, ctx, **kwargs):
-        if ctx:
-            await self._invoke(coro, ctx=ctx, **kwargs)
-        else:
-            await self._invoke(coro, **kwargs)
+    def resolve(self, registered_types):
+        """
+        Looks up the converter of every parameter. Called again whenever a
+        type is registered, as commands may be registered before the types
+        they use.
+        """
+        self.converters = [self._converter(param, registered_types)
+                           for param in self.params]
 
-    async def invoke(self):
-        if not self.sig_params:
-            if self.ctx:
-                await self._invoke(self.command, ctx=self.ctx)
+    def _converter(self, param, registered_types):
+        """
+        The three builtin types supported are: str, int, and float, or any
+        of the user-defined registered types.
+        """
+        annotation = param.annotation
+        if str == annotation:
+            return str
+        elif int == annotation:
+            return int
+        elif float == annotation:
+            return float
+        elif annotation in registered_types:
+            return registered_types[annotation]
+
+        def unsupported(cmd_param):
+            raise TypeError(f'the parameter {param.name} was unable '
+                            f'to be converted to a valid type for the '
+                            f'command {self.name}')
+        return unsupported
+
+    async def invoke(self, cmd_params, message):
+        """
+        ``cmd_params`` is either the list of message parameters, or the
+        text after the command name, only split when the command takes
+        parameters.
+        """
+        ctx = context.Context(message) if self.pass_ctx else None
+        if not self.arity:
+            if ctx:
+                await self._invoke(ctx=ctx)
             else:
-                await self._invoke(self.command)
+                await self._invoke()
             return
 
-        same_param_type = _same_sig_param_types(self.sig_params)
-        if same_param_type:
-            if not self.cmd_params:
-                log.info(f'the command `{self.name}` requires '
-                         f'message parameters')
-                return
-
-            param_type = self.sig_params[0].kind
-            sig_params_len = len(self.sig_params)
-            cmd_params_len = len(self.cmd_params)
-
-            if sig_params_len < cmd_params_len:
-                await self._invoke_more_cmd_params(param_type)
-            elif sig_params_len > cmd_params_len:
-                await self._invoke_less_cmd_params(param_type)
-            else:
-                await self._invoke_equal_params(param_type)
-        else:
-            log.info('the parameter kind for all the commands parameters must'
-                     'be the same')
-
-    async def _invoke_more_cmd_params(self, param_type):
-        if param_type == Parameter.VAR_POSITIONAL \
-                or param_type == Parameter.POSITIONAL_OR_KEYWORD:
-            """
-            Python only allows 1 VAR_POSITIONAL argument to be in a method,
-            so we don't have to worry about the cases where self.sig_params
-            is > 1 and we can just invoke
-            """
-            typed_args = self._get_invoke_args(self.cmd_params,
-                                               self.sig_params,
-                                               self.ctx)
-            await self._invoke(self.command, *typed_args)
-
-        elif param_type == Parameter.KEYWORD_ONLY:
-            typed_kwargs = self._get_invoke_kwargs(self.cmd_params,
-                                                   self.sig_params)
-            await self._invoke_kwargs(self.command, self.ctx, **typed_kwargs)
+        if self.kind is None:
+            log.info(_MIXED_KINDS)
+            return
+        if isinstance(cmd_params, str):
+            cmd_params = split_arguments(cmd_params)
+        if not cmd_params:
+            log.info(f'the command `{self.name}` requires '
+                     f'message parameters')
+            return
 
+        cmd_params_len = len(cmd_params)
+        if cmd_params_len > self.arity:
+            mode = self._more
+        elif cmd_params_len < self.arity:
+            mode = self._less
         else:
-            _log_unsupported_param_kind()
-
-    async def _invoke_less_cmd_params(self, param_type):
-        if param_type == Parameter.VAR_POSITIONAL:
-            typed_args = self._get_invoke_args(self.cmd_params,
-                                               self.sig_params,
-                                               self.ctx)
-            await self._invoke(self.command, *typed_args)
-        elif param_type == Parameter.POSITIONAL_OR_KEYWORD:
-            log.info('can\'t invoke a command with less message parameters '
-                     'than the signature requires')
-        elif param_type == Parameter.KEYWORD_ONLY:
-            log.info('can\'t build **kwargs with less message parameters than '
-                     'command signature params')
-        else:
-            _log_unsupported_param_kind()
-
-    async def _invoke_equal_params(self, param_type):
-        if param_type == Parameter.VAR_POSITIONAL \
-                or param_type == Parameter.POSITIONAL_OR_KEYWORD:
-            typed_args = self._get_invoke_args(self.cmd_params,
-                                               self.sig_params,
-                                               self.ctx)
-            await self._invoke(self.command, *typed_args)
-
-        elif param_type == Parameter.KEYWORD_ONLY:
-            typed_kwargs = self._get_invoke_kwargs(self.cmd_params,
-                                                   self.sig_params)
-            await self._invoke_kwargs(self.command, self.ctx, **typed_kwargs)
+            mode = self._equal
+
+        if mode == _ARGS:
+            args = self._convert(cmd_params)
+            if ctx:
+                args.insert(0, ctx)
+            await self._invoke(*args)
+        elif mode == _KWARGS:
+            kwargs = dict(zip(self.names, self._convert(cmd_params)))
+            if ctx:
+                kwargs['ctx'] = ctx
+            await self._invoke(**kwargs)
         else:
-            _log_unsupported_param_kind()
+            log.info(mode)
 
-    def _convert_to_annotation(self, sig_param, cmd_param):
-        """
-        Attempt to convert the parameter to the type of the signature
-        parameter. The three builtin types supported are: str, int, and float,
-        or any of the user-defined registered types.
-
-        :param sig_param:
-        :param cmd_param:
-        :return:
-        """
-        annotation = sig_param.annotation
+    def _convert(self, cmd_params):
+        typed = []
+        for converter, cmd_param in zip(self.converters, cmd_params):
+            try:
+                typed.append(converter(cmd_param))
+            except Exception as e:
+                annotation = self.params[len(typed)].annotation
+                log.info(f'unable to convert parameter "{cmd_param}" to '
+                         f'type {annotation}: {str(e)}')
+                raise e
+        return typed
+
+    async def _invoke(self, *args, **kwargs):
         try:
-            if str == annotation:
-                return cmd_param
-            elif int == annotation:
-                return int(cmd_param)
-            elif float == annotation:
-                return float(cmd_param)
-            elif sig_param.annotation in self.registered_types.keys():
-                return self.registered_types[sig_param.annotation](cmd_param)
-            else:
-                raise TypeError(
-                    f'the parameter {sig_param.name} was unable '
-                    f'to be converted to a valid type for the '
-                    f'command {self.command.__name__}')
+            await self.command(*args, **kwargs)
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            log.info(f'unable to convert parameter "{cmd_param}" to type '
-                     f'{annotation}: {str(e)}')
-            raise e
-
-    def _get_invoke_args(self, cmd_params, sig_params, ctx):
-        args = [arg for _, arg in
-                zip(sig_params, cmd_params)]
-        typed_args = [self._convert_to_annotation(param, arg) for param, arg in
-                      zip(sig_params, args)]
-        if ctx:
-            typed_args.insert(0, ctx)
-        return typed_args
-
-    def _get_invoke_kwargs(self, cmd_params, sig_params):
-        typed_kwargs = {}
-        for k, v in zip(sig_params, cmd_params):
-            typed_kwargs[k.name] = self._convert_to_annotation(k, v)
-        return typed_kwargs
-
-
-def _log_unsupported_param_kind():
-    log.info('the parameter kind for the commands parameters isn\'t supported')
-
-
-def _same_sig_param_types(sig_params):
-    param_types = [param.kind for param in sig_params]
-    return len(set(param_types)) == 1
+            try:
+                log.info(
+                    f'{self.name} raised an exception: {str(e)}')
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+from datetime import timedelta
+
+from .client import Client
+from .events import Event
+from .shard import HashRing
+from .cache import SharedUsersManager
+from .message import Message
+from .channel import Channel
+from .user import User
+
+log = logging.getLogger(__name__)
+
+# the write buffer size above which the bus drops events instead of
+# buffering them for a slow reader
+BUS_HIGH_WATER = 1024 * 1024
+
+_PAYLOAD_FIELDS = {
+    Message: ('id', 'content', 'channel', 'author'),
+    Channel: ('id', 'name'),
+    User: ('id', 'login', 'display_name'),
+}
+
+
+def to_payload(value):
+    """
+    Converts event arguments to something that can be sent as JSON.
+    Models become dicts of their main properties, anything unknown becomes
+    its :func:`str`.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_payload(v) for v in value]
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    for cls, fields in _PAYLOAD_FIELDS.items():
+        if isinstance(value, cls):
+            return {field: to_payload(getattr(value, field))
+                    for field in fields}
+    return str(value)
+
+
+class EventBus:
+    """
+    The local IPC bus between :class:`ShardedRunner` workers and
+    aggregators, served by the supervisor on a Unix socket.
+
+    Every connection starts with a ``{"role": ...}`` line, then publishers
+    send one JSON event per line, which is relayed as is to every
+    subscriber.
+    """
+    def __init__(self, path, *, loop):
+        self.path = path
+        self.loop = loop
+        self._server = None
+        self._subscribers = set()
+        self._relayed = 0
+        self._dropped = 0
+
+    def metrics(self):
+        return {'subscribers': len(self._subscribers),
+                'relayed': self._relayed, 'dropped': self._dropped}
+
+    async def start(self, sock=None):
+        if sock is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, sock=sock, loop=self.loop)
+        else:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path=self.path, loop=self.loop)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in self._subscribers:
+            writer.close()
+        self._subscribers.clear()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+        except ValueError:
+            writer.close()
+            return
+
+        if hello.get('role') == 'subscriber':
+            self._subscribers.add(writer)
+            # subscribers never send anything, this returns once they leave
+            await reader.read()
+            self._subscribers.discard(writer)
+        else:
+            async for line in reader:
+                self._relay(line)
+        writer.close()
+
+    def _relay(self, line):
+        for writer in list(self._subscribers):
+            if writer.transport.is_closing():
+                self._subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > BUS_HIGH_WATER:
+                self._dropped += 1
+            else:
+                writer.write(line)
+                self._relayed += 1
+
+
+class EventBusPublisher:
+    """
+    Sends a worker's events to the :class:`EventBus`. Events are dropped,
+    never buffered without bound, while the bus isn't reachable or can't
+    keep up.
+    """
+    def __init__(self, path, worker_id, *, loop):
+        self.path = path
+        self.worker_id = worker_id
+        self.loop = loop
+        self._writer = None
+        self._dropped = 0
+
+    async def connect(self):
+        if self._writer is None:
+            _, self._writer = await asyncio.open_unix_connection(
+                self.path, loop=self.loop)
+            self._writer.write(b'{"role": "publisher"}\n')
+
+    def publish(self, event, *args):
+        writer = self._writer
+        if writer is None or writer.transport.is_closing() or \
+                writer.transport.get_write_buffer_size() > BUS_HIGH_WATER:
+            self._dropped += 1
+            return
+        record = {'worker': self.worker_id, 'event': event,
+                  'args': to_payload(args)}
+        writer.write(json.dumps(record).encode() + b'\n')
+
+    def listener(self, event):
+        """
+        Returns a plain listener forwarding ``event``, to register with
+        :meth:`EventHandler.register`.
+        """
+        def forward(*args):
+            self.publish(event, *args)
+        forward.__name__ = f'_forward_{event}'
+        return forward
+
+
+class ShardedRunner:
+    """
+    Runs a :class:`Client` in each of ``processes`` worker processes, each
+    joining its own slice of ``channels``, to use more than one core.
+
+    Channels are split with the same consistent hashing as :class:`Shard`,
+    so a channel stays on the same worker as long as the amount of
+    processes doesn't change. The workers share the Helix users they
+    request through a :class:`SharedUsersManager` mapping, and each gets
+    ``1 / processes`` of the Helix and chat rate limits.
+
+    The events listed in ``forward_events`` are sent, as JSON, over a Unix
+    socket bus served by the supervisor to every aggregator process.
+
+    Workers and aggregators are started with the ``spawn`` method, so
+    ``setup`` and the aggregators must be importable functions.
+
+    Parameters
+    -----------
+
+    channels: List[:class:`str`]
+        The names of the channels to join.
+    processes: Optional[:class:`int`]
+        The amount of worker processes. Defaults to ``os.cpu_count()``
+    setup: Optional[Callable[[:class:`Client`], None]]
+        Called in every worker with its client, to register events.
+    aggregators: Optional[List[Callable]]
+        Functions, or coroutine functions, called in their own process with
+        the worker id, the event name and the event arguments of every
+        forwarded event.
+    forward_events: Optional[List[:class:`str`]]
+        The events sent to the aggregators. Defaults to
+        ``[Event.MESSAGE]``
+    client_class: Optional[Type[:class:`Client`]]
+        The class of the workers' clients. Defaults to :class:`Client`
+    client_options
+        Passed on to every worker's client. A ``rate_limit_share`` is the
+        share of the limits all the workers may use together, each worker
+        gets ``1 / processes`` of it.
+
+    .. code-block:: python3
+
+        def setup(client):
+            @client.event(twitch.Event.MESSAGE)
+            async def on_message(message):
+                ...
+
+        def count(worker_id, event, args):
+            ...
+
+        if __name__ == '__main__':
+            runner = ShardedRunner(channels, processes=4, setup=setup,
+                                   aggregators=[count])
+            runner.run(username, access_token, client_id)
+    """
+    def __init__(self, channels, *, processes=None, setup=None,
+                 aggregators=(), forward_events=(Event.MESSAGE,),
+                 client_class=Client, **client_options):
+        self.channels = [channel.lstrip('#').lower() for channel in channels]
+        self.processes = processes or os.cpu_count() or 1
+        self.setup = setup
+        self.aggregators = list(aggregators)
+        self.forward_events = list(forward_events)
+        self.client_class = client_class
+        self.client_options = client_options
+
+    def channels_for(self, worker_id):
+        """
+        Returns the channels the worker with the id passed joins.
+        """
+        ring = HashRing(range(self.processes))
+        return [channel for channel in self.channels
+                if ring.get(channel) == worker_id]
+
+    def run(self, username, access_token, client_id):
+        """
+        Starts the workers and aggregators, then serves the event bus
+        until every worker exits. Blocks like :meth:`Client.run`.
+        """
+        context = multiprocessing.get_context('spawn')
+        manager = SharedUsersManager(ctx=context)
+        manager.start()
+        shared_users = manager.SharedUsers()
+
+        directory = tempfile.mkdtemp(prefix='twitch-')
+        path = os.path.join(directory, 'bus.sock')
+        # bound before anything is started, so nobody connects too early
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen()
+
+        aggregators = [
+            context.Process(target=_run_aggregator, args=(path, aggregator),
+                            name=f'twitch-aggregator-{i}')
+            for i, aggregator in enumerate(self.aggregators)]
+        workers = [
+            context.Process(
+                target=_run_worker,
+                args=(self, worker_id, path, shared_users, username,
+                      access_token, client_id),
+                name=f'twitch-worker-{worker_id}')
+            for worker_id in range(self.processes)]
+
+        loop = asyncio.new_event_loop()
+        bus = EventBus(path, loop=loop)
+        try:
+            loop.run_until_complete(bus.start(sock=sock))
+            for process in aggregators + workers:
+                process.start()
+            loop.run_until_complete(self._wait(workers, loop))
+        except KeyboardInterrupt:
+            log.info('received signal to terminate the workers')
+        finally:
+            for process in workers + aggregators:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            loop.run_until_complete(bus.close())
+            loop.close()
+            manager.shutdown()
+            if os.path.exists(path):
+                os.unlink(path)
+            os.rmdir(directory)
+
+    @staticmethod
+    async def _wait(processes, loop):
+        await asyncio.gather(
+            *[loop.run_in_executor(None, process.join)
+              for process in processes], loop=loop)
+
+
+def _run_worker(runner, worker_id, path, shared_users, username,
+                access_token, client_id):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    options = dict(runner.client_options)
+    share = options.pop('rate_limit_share', 1.0) / runner.processes
+    client = runner.client_class(
+        loop=loop, shared_users=shared_users, rate_limit_share=share,
+        **options)
+
+    publisher = EventBusPublisher(path, worker_id, loop=loop)
+    for event in runner.forward_events:
+        client.event_handler.register(event, publisher.listener(event))
+
+    channels = runner.channels_for(worker_id)
+
+    async def _join_worker_channels(user):
+        await publisher.connect()
+        # after a reconnect, the client rejoins the channels by itself
+        missing = [channel for channel in channels
+                   if client.get_channel(channel) is None]
+        if missing:
+            await client.join_channels(missing, wait=False)
+
+    client.event_handler.register(Event.CONNECTED, _join_worker_channels)
+    if runner.setup:
+        runner.setup(client)
+
+    log.info(f'worker {worker_id} starting with {len(channels)} channels')
+    client.run(username, access_token, client_id)
+
+
+def _run_aggregator(path, aggregator):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def consume():
+        reader, writer = await asyncio.open_unix_connection(path, loop=loop)
+        writer.write(b'{"role": "subscriber"}\n')
+        async for line in reader:
+            record = json.loads(line)
+            result = aggregator(record['worker'], record['event'],
+                                record['args'])
+            if asyncio.iscoroutine(result):
+                await result
+
+    try:
+        loop.run_until_complete(consume())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
@@ -0,0 +1,296 @@
+import asyncio
+import enum
+import logging
+from collections import deque, OrderedDict
+
+from .opcodes import OpCode
+
+log = logging.getLogger(__name__)
+
+
+class Lane(enum.IntEnum):
+    """
+    The priority lanes outgoing IRC messages are queued in. Lower values
+    are always sent first.
+    """
+    CONTROL = 0  #: PONG, authentication and capability requests
+    MODERATION = 1  #: chat commands such as ``/ban`` or ``/timeout``
+    CHAT = 2  #: regular chat messages
+    JOIN = 3  #: channel joins and parts
+
+
+MODERATION_COMMANDS = {
+    'ban', 'unban', 'timeout', 'untimeout', 'delete', 'clear', 'slow',
+    'slowoff', 'followers', 'followersoff', 'subscribers', 'subscribersoff',
+    'emoteonly', 'emoteonlyoff', 'r9kbeta', 'r9kbetaoff', 'mod', 'unmod',
+    'vip', 'unvip'
+}
+
+
+class RateWindow:
+    """
+    A token bucket where every spent token is given back ``period``
+    seconds after it was spent, which is how Twitch counts its
+    "N messages per 30 seconds" limits.
+    """
+    def __init__(self, period):
+        self.period = period
+        self._spent = deque()
+
+    def delay(self, limit, weight, now):
+        spent = self._spent
+        while spent and spent[0] <= now - self.period:
+            spent.popleft()
+
+        excess = len(spent) + weight - limit
+        if excess <= 0:
+            return 0
+        if excess > len(spent):
+            # worth more than the whole limit, which the senders avoid. It
+            # can only go into an empty window, and is charged in full
+            return spent[-1] + self.period - now if spent else 0
+        return spent[excess - 1] + self.period - now
+
+    def spend(self, weight, now):
+        self._spent.extend([now] * weight)
+
+
+class SendLimits:
+    """
+    The Twitch chat limits of the client's account. They are shared by every
+    connection the client opens, and survive reconnects.
+
+    https://dev.twitch.tv/docs/irc/guide#command--message-limits
+
+    ``share`` is the fraction of the limits this process may use, when
+    several processes send with the same account.
+    """
+    CHAT_LIMIT = 20
+    CHAT_MODERATOR_LIMIT = 100
+    CHAT_PERIOD = 30
+    JOIN_LIMIT = 20
+    JOIN_PERIOD = 10
+
+    def __init__(self, share=1.0):
+        self.chat_limit = max(int(SendLimits.CHAT_LIMIT * share), 1)
+        self.chat_moderator_limit = max(
+            int(SendLimits.CHAT_MODERATOR_LIMIT * share), 1)
+        self.join_limit = max(int(SendLimits.JOIN_LIMIT * share), 1)
+        self.chat = RateWindow(SendLimits.CHAT_PERIOD)
+        self.join = RateWindow(SendLimits.JOIN_PERIOD)
+        self._moderator = set()
+        self._slow = {}
+        self._last_sent = {}
+
+    def is_moderator(self, channel_name):
+        return channel_name in self._moderator
+
+    def set_moderator(self, channel_name, is_moderator):
+        if is_moderator:
+            self._moderator.add(channel_name)
+        else:
+            self._moderator.discard(channel_name)
+
+    def set_slow(self, channel_name, seconds):
+        if seconds:
+            self._slow[channel_name] = seconds
+        else:
+            self._slow.pop(channel_name, None)
+
+    def forget(self, channel_name):
+        """
+        Drops what is known about a channel once it was left, so joining
+        and leaving many channels doesn't grow the limits forever.
+        """
+        self._moderator.discard(channel_name)
+        self._slow.pop(channel_name, None)
+        self._last_sent.pop(channel_name, None)
+
+    def delay(self, message, now):
+        if message.lane == Lane.CONTROL:
+            return 0
+        if message.lane == Lane.JOIN:
+            return self.join.delay(self.join_limit, message.weight, now)
+
+        channel_name = message.channel_name
+        if self.is_moderator(channel_name):
+            return self.chat.delay(self.chat_moderator_limit, 1, now)
+
+        delay = self.chat.delay(self.chat_limit, 1, now)
+        slow = self._slow.get(channel_name)
+        last_sent = self._last_sent.get(channel_name)
+        if slow and last_sent is not None:
+            delay = max(delay, last_sent + slow - now)
+        return delay
+
+    def spend(self, message, now):
+        if message.lane == Lane.JOIN:
+            self.join.spend(message.weight, now)
+        elif message.lane != Lane.CONTROL:
+            self.chat.spend(1, now)
+            self._last_sent[message.channel_name] = now
+
+
+class OutgoingMessage:
+    def __init__(self, data, *, future, queued_at):
+        self.data = data
+        self.future = future
+        self.queued_at = queued_at
+        self.channel_name = None
+        self.weight = 1
+
+        command, _, params = data.partition(' ')
+        if command == OpCode.PRIVMSG:
+            channel_name, _, content = params.partition(' ')
+            self.channel_name = channel_name.lstrip('#').lower()
+            content = content[1:] if content.startswith(':') else content
+            name = content[1:].split(' ', 1)[0].lower() \
+                if content[:1] in ('/', '.') else None
+            self.lane = Lane.MODERATION if name in MODERATION_COMMANDS \
+                else Lane.CHAT
+        elif command == OpCode.JOIN or command == OpCode.PART:
+            self.lane = Lane.JOIN
+            self.weight = params.count(',') + 1
+        else:
+            self.lane = Lane.CONTROL
+
+
+class SendScheduler:
+    """
+    Queues every message a :class:`WebSocketClient` sends and writes them
+    to the socket as fast as the :class:`SendLimits` allow, highest
+    priority :class:`Lane` first.
+
+    Chat messages are queued per channel, and the channels of a lane take
+    turns. Only the oldest message of each queue can be sent next, so
+    picking a message costs one limit check per channel with messages
+    waiting, however many are queued.
+    """
+    def __init__(self, send, limits, *, loop):
+        self._send = send
+        self.limits = limits
+        self.loop = loop
+        # lane -> channel name, or None outside of chat lanes -> messages
+        self._lanes = {lane: OrderedDict() for lane in Lane}
+        self._depth = {lane: 0 for lane in Lane}
+        self._wakeup = asyncio.Event(loop=loop)
+        self._task = None
+        # the message being written to the socket, out of the queues
+        self._in_flight = None
+        self._closed = None
+        self._sent = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def queue_depth(self):
+        """
+        The amount of messages waiting to be sent, per lane
+
+        :type: Dict[:class:`str`, :class:`int`]
+        """
+        return {lane.name.lower(): depth
+                for lane, depth in self._depth.items()}
+
+    def metrics(self):
+        average_wait = self._wait_total / self._sent if self._sent else 0.0
+        return {'queue_depth': self.queue_depth, 'sent': self._sent,
+                'average_wait': average_wait, 'max_wait': self._wait_max}
+
+    def start(self):
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+
+    def stop(self, exc):
+        self._closed = exc
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        messages = [message for channels in self._lanes.values()
+                    for queue in channels.values() for message in queue]
+        if self._in_flight is not None:
+            messages.append(self._in_flight)
+            self._in_flight = None
+        for channels in self._lanes.values():
+            channels.clear()
+        self._depth = {lane: 0 for lane in Lane}
+        for message in messages:
+            if not message.future.done():
+                message.future.set_exception(exc)
+
+    def enqueue(self, data):
+        future = self.loop.create_future()
+        if self._closed is not None:
+            future.set_exception(self._closed)
+            return future
+
+        message = OutgoingMessage(data, future=future,
+                                  queued_at=self.loop.time())
+        channels = self._lanes[message.lane]
+        queue = channels.get(message.channel_name)
+        if queue is None:
+            queue = channels[message.channel_name] = deque()
+        queue.append(message)
+        self._depth[message.lane] += 1
+        self._wakeup.set()
+        return future
+
+    def _next(self):
+        now = self.loop.time()
+        min_delay = None
+        for lane in Lane:
+            channels = self._lanes[lane]
+            for channel_name, queue in channels.items():
+                message = queue[0]
+                delay = self.limits.delay(message, now)
+                if delay <= 0:
+                    queue.popleft()
+                    self._depth[lane] -= 1
+                    # the channel goes to the back of the lane, so a busy
+                    # channel doesn't starve the others
+                    if queue:
+                        channels.move_to_end(channel_name)
+                    else:
+                        del channels[channel_name]
+                    return message, 0
+                min_delay = delay if min_delay is None else \
+                    min(min_delay, delay)
+        return None, min_delay
+
+    async def _run(self):
+        while True:
+            message, delay = self._next()
+            if message is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay,
+                                           loop=self.loop)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = self.loop.time()
+            self.limits.spend(message, now)
+            wait = now - message.queued_at
+            self._sent += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+            self._in_flight = message
+            try:
+                await self._send(message.data)
+            except asyncio.CancelledError:
+                # stop() fails the message, unless something else cancelled
+                # the task, which the sender must still hear about
+                if not message.future.done():
+                    message.future.cancel()
+                raise
+            except Exception as e:
+                if not message.future.done():
+                    message.future.set_exception(e)
+            else:
+                if not message.future.done():
+                    message.future.set_result(None)
+            finally:
+                self._in_flight = None
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import logging
+from bisect import bisect
+from collections import deque
+
+import aiohttp
+import websockets
+
+from .events import Event
+from .http import HTTPException
+from .websocket import WebSocketClient
+from .exception import WebSocketConnectionClosed, WebSocketLoginFailure
+from .backpressure import BoundedQueue
+from .metrics import Stage
+from .opcodes import OpCode
+from .parser import TMI_PONG, CRLF
+
+log = logging.getLogger(__name__)
+
+
+class HashRing:
+    """
+    A consistent hash ring of shard ids. Each shard is placed on the ring
+    ``replicas`` times, so adding a shard only moves about ``1 / n`` of the
+    keys to it, and the keys are spread evenly.
+
+    The hash is md5 rather than :func:`hash`, so every process agrees on
+    where a channel goes.
+    """
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = HashRing._hash(f'{node}:{i}')
+            index = bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node):
+        kept = [(h, n) for h, n in zip(self._hashes, self._nodes)
+                if n != node]
+        self._hashes = [h for h, _ in kept]
+        self._nodes = [n for _, n in kept]
+
+    def get(self, key):
+        for node in self.iter_nodes(key):
+            return node
+        return None
+
+    def iter_nodes(self, key):
+        """
+        Yields every node once, starting from the one that owns ``key`` and
+        going clockwise around the ring.
+        """
+        if not self._hashes:
+            return
+        start = bisect(self._hashes, HashRing._hash(key))
+        seen = set()
+        length = len(self._nodes)
+        for i in range(length):
+            node = self._nodes[(start + i) % length]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+
+class Shard:
+    """
+    One websocket connection of a :class:`Client` and the channels it
+    joined. Every shard reads, parses and reconnects on its own, so a
+    disconnect only affects the channels of that shard.
+
+    Attributes
+    -----------
+    id: :class:`int`
+        The id of the shard. Shard ``0`` is the primary shard, which
+        dispatches :attr:`Event.CONNECTED` and :attr:`Event.DISCONNECT`.
+    ws
+        The websocket of the shard. Could be ``None``.
+    ingress: :class:`BoundedQueue`
+        The queue of received messages waiting to be parsed. Could be
+        ``None``.
+    channels: Set[:class:`str`]
+        The names of the channels assigned to the shard.
+    """
+    # the amount of heartbeats the latency is averaged over
+    LATENCY_WINDOW = 5
+    # seconds to wait for the rejoins to be confirmed, once they were sent
+    REJOIN_TIMEOUT = 10.0
+
+    def __init__(self, shard_id, client):
+        self.id = shard_id
+        self.ws = None
+        self.ingress = None
+        self.channels = set()
+        # channels assigned but whose JOIN hasn't been sent yet, they are
+        # joined by Client.join_channel rather than rejoined
+        self._joining = set()
+        self._client = client
+        self._connected = asyncio.Event(loop=client.loop)
+        self._task = None
+        self._latencies = deque(maxlen=Shard.LATENCY_WINDOW)
+
+    def __repr__(self):
+        return f'<Shard id={self.id} channels={len(self.channels)}>'
+
+    @property
+    def latency(self):
+        """
+        The average round trip time of the last heartbeats, in seconds.
+        ``float('inf')`` until the first heartbeat was answered.
+
+        :type: :class:`float`
+        """
+        if not self._latencies:
+            return float('inf')
+        return sum(self._latencies) / len(self._latencies)
+
+    @property
+    def is_primary(self):
+        return self.id == 0
+
+    def is_connected(self):
+        return self._connected.is_set()
+
+    async def wait_until_connected(self):
+        await self._connected.wait()
+
+    def start(self, *, reconnect=True):
+        if self._task is None or self._task.done():
+            self._task = self._client.loop.create_task(
+                self.run(reconnect=reconnect))
+        return self._task
+
+    async def run(self, *, reconnect=True):
+        client = self._client
+        backoff = client.backoff
+        while not client._closed:
+            try:
+                await self._connect()
+            except (OSError,
+                    HTTPException,
+                    WebSocketConnectionClosed,
+                    WebSocketLoginFailure,
+                    aiohttp.ClientError,
+                    asyncio.TimeoutError,
+                    websockets.InvalidHandshake,
+                    websockets.WebSocketProtocolError) as e:
+
+                self._connected.clear()
+                backoff.disconnected(self)
+                client.event_handler.emit(Event.SHARD_DISCONNECTED, self.id)
+                if self.is_primary:
+                    client.event_handler.emit(Event.DISCONNECT)
+                if not reconnect:
+                    await client.close()
+                    if isinstance(e,
+                                  WebSocketConnectionClosed) and \
+                            e.code == 1000:
+                        # websocket was closed cleanly, no need to raise here
+                        return
+                    raise
+
+                if client._closed:
+                    return
+
+                retry = backoff.sleep_for(self)
+                log.exception(f'shard {self.id} attemping to reconnect in '
+                              f'{retry:.2f}s')
+                await asyncio.sleep(retry, loop=client.loop)
+
+    async def close(self):
+        self._connected.clear()
+        if self.ws and self.ws.open:
+            await self.ws.close()
+
+    async def _connect(self):
+        client = self._client
+        ws = WebSocketClient.create_client(client)
+        user = None
+        if self.is_primary:
+            user = await client.get_user(login=client.username)
+        self.ws = await asyncio.wait_for(ws, timeout=120.0, loop=client.loop)
+        self._latencies.clear()
+        self._connected.set()
+        client.backoff.connected(self)
+        client.event_handler.emit(Event.SHARD_CONNECTED, self.id)
+        if self.is_primary:
+            client.event_handler.emit(Event.CONNECTED, user)
+
+        # reading frames is decoupled from parsing them, so a slow parse
+        # (or a Helix request made while parsing) never stalls the socket
+        self.ingress = BoundedQueue(client._ingress_queue_size,
+                                    client._ingress_overflow,
+                                    loop=client.loop)
+        tasks = [client.loop.create_task(self._read_frames(self.ws))]
+        tasks += [client.loop.create_task(self._process_frames(self.ws))
+                  for _ in range(client._ingress_workers)]
+        if client._heartbeat_interval:
+            tasks.append(client.loop.create_task(self._heartbeat(self.ws)))
+        rejoin = self.channels - self._joining
+        if rejoin:
+            tasks.append(client.loop.create_task(
+                self._rejoin(self.ws, sorted(rejoin))))
+        try:
+            done, _ = await asyncio.wait(tasks, loop=client.loop,
+                                         return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _rejoin(self, ws, channel_names):
+        """
+        Joins the channels the shard was in before it reconnected. The
+        channel registry and the user cache are kept as they were, so
+        the first messages after the reconnect don't need any lookups.
+
+        The rejoins are confirmed like the ones of
+        :meth:`Client.join_channels`, channels that weren't confirmed in
+        :attr:`REJOIN_TIMEOUT` seconds are reported as failed.
+        """
+        client = self._client
+        log.info(f'shard {self.id} rejoining {len(channel_names)} channels')
+        futures = {}
+        for channel_name in channel_names:
+            futures[channel_name] = client._pending_future(
+                client._pending_joins, channel_name)
+        try:
+            await ws.send_join_many(channel_names)
+        except BaseException as e:
+            client._fail_pending(client._pending_joins, channel_names, e)
+            raise
+
+        await asyncio.wait(futures.values(), timeout=Shard.REJOIN_TIMEOUT,
+                           loop=client.loop)
+        rejoined = []
+        failed = []
+        for channel_name, future in futures.items():
+            if future.done() and not future.cancelled() and \
+                    future.exception() is None:
+                rejoined.append(channel_name)
+            else:
+                failed.append(channel_name)
+        if failed:
+            log.warning(f'shard {self.id} failed to rejoin {len(failed)} '
+                        f'channels')
+        client.event_handler.emit(Event.CHANNELS_REJOINED, rejoined,
+                                  failed)
+
+    async def _heartbeat(self, ws):
+        client = self._client
+        while True:
+            await asyncio.sleep(client._heartbeat_interval, loop=client.loop)
+            try:
+                latency = await ws.heartbeat(client._heartbeat_timeout)
+            except asyncio.TimeoutError:
+                # the connection is dead even if TCP doesn't know it yet,
+                # don't wait for the OS to time it out
+                log.warning(f'shard {self.id} got no PONG in '
+                            f'{client._heartbeat_timeout}s, reconnecting')
+                client.loop.create_task(ws.close())
+                raise WebSocketConnectionClosed('heartbeat timed out')
+            self._latencies.append(latency)
+
+    async def _read_frames(self, ws):
+        metrics = self._client.metrics
+        while True:
+            msg = await ws.read_frame()
+            start = metrics.start()
+            while msg.startswith(OpCode.PING) or msg.startswith(TMI_PONG):
+                # answer the server's keepalive straight away instead of
+                # queueing it behind chat messages, and don't let the
+                # queue delay inflate the heartbeat latency. Only the
+                # keepalive line is handled here, whatever else the frame
+                # holds is parsed by the workers like any other frame
+                line, _, msg = msg.partition(CRLF)
+                await ws.receive(line)
+            if msg and not await self.ingress.put(msg):
+                log.debug('ingress queue is full, dropped a message')
+            metrics.observe(Stage.RECV, start)
+
+    async def _process_frames(self, ws):
+        client = self._client
+        metrics = client.metrics
+        while True:
+            msg = await self.ingress.get()
+            metrics.observe_duration(Stage.QUEUE_WAIT, self.ingress.lag)
+            start = metrics.start()
+            await ws.receive(msg)
+            metrics.observe(Stage.PARSE, start)
+            # listeners using Overflow.BLOCK push back on the ingress queue
+            await client.event_handler.wait_for_room()
@@ -1,4 +1,36 @@
 import enum
+from array import array
+from collections import OrderedDict
+
+# the most values kept for reuse by each intern table. Twitch only has a
+# few hundred distinct badges and colors, past the limit the least recently
+# used values are evicted, so a flood of custom badges can't grow the tables
+# forever
+MAX_INTERNED = 4096
+
+
+class _InternTable:
+    """
+    A size bounded LRU table of shared instances, keyed on the raw tag
+    values they were built from.
+    """
+    def __init__(self, max_size=MAX_INTERNED):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        instance = self._entries.get(key)
+        if instance is not None:
+            self._entries.move_to_end(key)
+        return instance
+
+    def put(self, key, instance):
+        self._entries[key] = instance
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
 
 
 class Tags:
@@ -223,8 +255,15 @@ class Badge:
         TURBO = 7  #:
         PRIME = 8  #:
 
+    __slots__ = ('_type', '_version', '_subscriber_months')
+
+    # raw badge, and the badge info for subscriber badges -> shared Badge
+    _interned = _InternTable()
+    # raw badges tag, and the badge info if it is read -> shared tuple
+    _interned_tags = _InternTable()
+
     def __init__(self, badge, info):
-        info_parts = info.split('/')
+        info_parts = info.split('/') if info else []
         badge_parts = badge.split('/')
         if len(badge_parts) != 2:
             raise ValueError(f'badge {badge} is not in the correct format')
@@ -233,6 +272,36 @@ class Badge:
         self._subscriber_months = int(info_parts[1]) if \
             self._type == Badge.Type.SUBSCRIBER and info else None
 
+    @classmethod
+    def from_tag(cls, badge, info):
+        """
+        Returns the badge for a ``badges`` tag entry, shared with every
+        message that has the same entry. Badges are never modified, so
+        sharing them is safe.
+        """
+        # only the subscriber badge reads the badge info
+        key = (badge, info) if badge.startswith('subscriber/') else badge
+        instance = cls._interned.get(key)
+        if instance is None:
+            instance = cls(badge, info)
+            cls._interned.put(key, instance)
+        return instance
+
+    @classmethod
+    def from_tags(cls, badges, info):
+        """
+        Returns the badges of a ``badges`` tag as a :class:`tuple`, shared
+        with every message that has the same tags, so the tag is only split
+        the first time it is seen.
+        """
+        key = (badges, info) if 'subscriber/' in badges else badges
+        instances = cls._interned_tags.get(key)
+        if instances is None:
+            instances = tuple(cls.from_tag(badge, info)
+                              for badge in badges.split(',') if badge)
+            cls._interned_tags.put(key, instances)
+        return instances
+
     @property
     def type(self):
         """
@@ -299,6 +368,11 @@ class Badge:
 
 
 class Color:
+    __slots__ = ('_red', '_green', '_blue', '_hex')
+
+    # raw color tag -> shared Color
+    _interned = _InternTable()
+
     def __init__(self, hex_rgb):
         self._red = None
         self._green = None
@@ -315,6 +389,18 @@ class Color:
         self._green = int(hex_components[1], 16)
         self._blue = int(hex_components[2], 16)
 
+    @classmethod
+    def from_tag(cls, hex_rgb):
+        """
+        Returns the color for a ``color`` tag, shared with every message
+        that has the same color.
+        """
+        instance = cls._interned.get(hex_rgb)
+        if instance is None:
+            instance = cls(hex_rgb)
+            cls._interned.put(hex_rgb, instance)
+        return instance
+
     @property
     def red(self):
         """
@@ -363,15 +449,41 @@ class Emote:
         MEDIUM = 2.0
         LARGE = 3.0
 
+    __slots__ = ('_id', '_spans')
+
     def __init__(self, emote):
-        emote_parts = emote.split(':')
-        if len(emote_parts) != 2:
+        emote_id, separator, ranges = emote.partition(':')
+        if not separator or ':' in ranges:
             raise ValueError(f'invalid emote format: {emote}')
-        self._id = emote_parts[0]
-        # TODO: think of something else useful to expose with this data in
-        #   the context of a message
-        index_parts = emote_parts[1].split(',')
-        self._indexes = [tuple(index.split('-')) for index in index_parts]
+        self._id = emote_id
+        # flat start, end pairs. Twitch's end index is inclusive, it's
+        # stored exclusive so the pairs can be used as slices
+        self._spans = array('I')
+        for index in ranges.split(','):
+            start, _, end = index.partition('-')
+            self._spans.append(int(start))
+            self._spans.append(int(end) + 1)
+
+    @property
+    def id(self):
+        """
+        The id of the emote
+
+        :type: :class:`str`
+        """
+        return self._id
+
+    @property
+    def spans(self):
+        """
+        The ``(start, end)`` positions of the emote in the message, ``end``
+        excluded, so ``content[start:end]`` is the emote's text. Positions
+        are counted in code points, like :class:`str` indexes.
+
+        :type: List[Tuple[:class:`int`, :class:`int`]]
+        """
+        spans = self._spans
+        return list(zip(spans[::2], spans[1::2]))
 
     @property
     def occurances(self):
@@ -380,7 +492,7 @@ class Emote:
 
         :type: :class:`int`
         """
-        return len(self._indexes)
+        return len(self._spans) // 2
 
     @property
     def url(self, size=None):
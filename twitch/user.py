@@ -20,7 +20,21 @@ class User:
         ADMIN = 2  #:
         STAFF = 3  #:
 
+    __slots__ = ('_session', '_broadcaster', '_description', '_display_name',
+                 '_email', '_user_id', '_login', '_offline_image_url',
+                 '_profile_image_url', '_user_type', '_view_count', '_color',
+                 '_badges', '_is_mod', '_partial')
+
     def __init__(self, json, *, session):
+        self._session = session
+        self._update(json)
+        # below are properties only set by tags
+        self._color = None
+        self._badges = None
+        self._is_mod = None
+        self._partial = False
+
+    def _update(self, json):
         self._broadcaster = User._to_broadcaster(json.get('broadcaster_type'))
         self._description = json.get('description')
         self._display_name = json.get('display_name')
@@ -33,11 +47,22 @@ class User:
         self._user_type = User._to_type(json.get('type'))
         view_count = json.get('view_count')
         self._view_count = int(view_count) if view_count else None
-        self._session = session
-        # below are properties only set by tags
-        self._color = None
-        self._badges = None
-        self._is_mod = None
+
+    @classmethod
+    def from_tags(cls, login, tags_dict, *, session):
+        """
+        Builds a partial user from a login and the IRC tags attached to
+        a message, without making a request to the Helix API.
+
+        Only the login and the tag derived properties are set, every other
+        property is ``None`` until :meth:`fetch` is awaited.
+        """
+        user = cls({'login': login}, session=session)
+        user._broadcaster = None
+        user._user_type = None
+        user._partial = True
+        user.add_tags_data(tags_dict)
+        return user
 
     @property
     def broadcaster(self):
@@ -143,30 +168,80 @@ class User:
 
     @property
     def badges(self):
-        """"""
-        return self._badges
+        """
+        The user's badges in the channel of the message. The
+        :class:`Badge` objects are shared between the users with the same
+        badges, the list is a new one every time.
+
+        :type: List[:class:`Badge`]
+        """
+        if self._badges is None:
+            return None
+        return list(self._badges)
 
     @property
     def is_mod(self):
         """"""
         return self._is_mod
 
+    @property
+    def is_partial(self):
+        """
+        Whether the user was built only from IRC tags. A partial user
+        does not have any of the Helix API data (description, view count,
+        broadcaster type, etc.) until :meth:`fetch` is awaited.
+
+        :type: :class:`bool`
+        """
+        return self._partial
+
+    async def fetch(self):
+        """
+        Fetches the Helix API data of a partial user and fills in the
+        missing properties. Does nothing if the user isn't partial.
+
+        :return: The same :class:`User`, for convenience
+        """
+        if not self._partial:
+            return self
+
+        user = await self._session.get_user(user_id=self.id,
+                                            login=self.login)
+        if user:
+            # tag data is more recent than what the API has, so keep it
+            display_name = self._display_name
+            self._update_from(user)
+            if display_name:
+                self._display_name = display_name
+            self._partial = False
+        return self
+
+    def _update_from(self, user):
+        self._broadcaster = user._broadcaster
+        self._description = user._description
+        self._display_name = user._display_name
+        self._email = user._email
+        self._user_id = user._user_id
+        self._login = user._login
+        self._offline_image_url = user._offline_image_url
+        self._profile_image_url = user._profile_image_url
+        self._user_type = user._user_type
+        self._view_count = user._view_count
+
     def add_tags_data(self, tags_dict):
         if not tags_dict:
             return
 
         bad_info = tags_dict.get(Tags.BADGE_INFO)
         badges_str = tags_dict.get(Tags.BADGES)
-        badges = [Badge(badge, bad_info) for badge in badges_str.split(',') if
-                  badges_str]
-
-        self._badges = badges
+        if badges_str is not None:
+            self._badges = Badge.from_tags(badges_str, bad_info)
 
         # TODO: bits
 
         color = tags_dict.get(Tags.COLOR)
         if color:
-            self._color = Color(color)
+            self._color = Color.from_tag(color)
 
         # display name only set if its different than the current display name
         display_name = tags_dict.get(Tags.DISPLAY_NAME)
@@ -179,11 +254,11 @@ class User:
         if mod:
             self._is_mod = int(mod) == 1
 
-        # user id only set if its different than the current user id
-        # (which it should never be, but this is just for completeness)
+        # user id is only ever missing for partial users, as the Helix
+        # API always returns it
         user_id = tags_dict.get(Tags.USER_ID)
-        if user_id:
-            self._user_id == user_id if user_id != self.id else self.id
+        if user_id and self._user_id is None:
+            self._user_id = int(user_id)
 
         # TODO: parse emote-sets. Only useful for making requests to the V5
         #  API which currently isn't supported
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import random
+import time
 
 import websockets
 
@@ -6,6 +9,7 @@ from .opcodes import OpCode
 from .events import Event
 from .exception import WebSocketConnectionClosed
 from .http import HTTPClient
+from .scheduler import SendScheduler
 from .parser import MessageParserHandler, TMI_URL, \
     CHANNEL_PREFIX, TAGS_CAPABILITY, MEMBERSHIP_CAPABILITY, COMMANDS_CAPABILITY
 
@@ -14,32 +18,81 @@ log = logging.getLogger()
 
 class TwitchBackoff:
     """
-    Using the algorithm recommended by twitch:
+    Exponential backoff with a cap and full jitter, based on the algorithm
+    recommended by twitch:
     https://dev.twitch.tv/docs/irc/guide#re-connecting-to-twitch-irc
+
+    The delay is picked at random between ``0`` and ``base * 2 ** attempt``,
+    capped at ``max_delay``, so the first retry waits at most ``base``. The
+    randomness spreads out connections that failed at the same time, such
+    as the shards of a :class:`Client` after an outage, even on their first
+    retry.
+
+    Attempts are counted per ``key``, e.g. the :class:`Shard`, so a failing
+    connection doesn't slow down the others, and are reset once that
+    connection stayed up for ``stable_after`` seconds.
+
+    Parameters
+    -----------
+
+    base: Optional[:class:`float`]
+        Defaults to ``1``
+    max_delay: Optional[:class:`float`]
+        Defaults to ``120``
+    stable_after: Optional[:class:`float`]
+        Defaults to ``60``
     """
 
-    def __init__(self):
-        self._sleep_period = 1
-        self._first = True
+    def __init__(self, base=1.0, max_delay=120.0, stable_after=60.0):
+        self.base = base
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        # key -> failed attempts since the last stable connection
+        self._attempts = {}
+        # key -> when the connection was made
+        self._connected_at = {}
 
-    def sleep_for(self):
-        # first attempt we do an immediate retry
-        if self._first:
-            self._first = False
-            return 0
-        else:
-            self._sleep_period = self._sleep_period * 2
-            return self._sleep_period
+    def attempt(self, key=None):
+        return self._attempts.get(key, 0)
+
+    def sleep_for(self, key=None):
+        attempt = self._attempts.get(key, 0)
+        self._attempts[key] = attempt + 1
+        ceiling = min(self.max_delay, self.base * 2 ** min(attempt, 32))
+        return random.uniform(0, ceiling)
+
+    def reset(self, key=None):
+        self._attempts.pop(key, None)
+
+    def connected(self, key=None):
+        self._connected_at[key] = time.monotonic()
+
+    def disconnected(self, key=None):
+        connected_at = self._connected_at.pop(key, None)
+        if connected_at is not None and \
+                time.monotonic() - connected_at >= self.stable_after:
+            self.reset(key)
 
 
 class WebSocketClient(websockets.client.WebSocketClientProtocol):
     WSS_URL = 'wss://irc-ws.chat.twitch.tv:443'
     CAPABILITY_REQUEST = f'{OpCode.CAP} {OpCode.REQ} :'
+    # IRC lines are at most 512 bytes, CRLF included
+    MAX_LINE_LENGTH = 510
+    # the join limit is 20 channels per 10 seconds, a bigger line would
+    # have to wait for more than the whole window. The batch is also
+    # capped at this process' share of the limit, see SendLimits
+    JOIN_BATCH_SIZE = 20
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._emit = lambda *args: None
         self._authenticated = False
+        self._scheduler = None
+        self._send_limits = None
+        # ping token -> future resolved with the time the PONG arrived
+        self._pong_waiters = {}
+        self._ping_count = 0
 
     @staticmethod
     def _normalize_access_token(access_token):
@@ -60,6 +113,10 @@ class WebSocketClient(websockets.client.WebSocketClientProtocol):
         ws.access_token = WebSocketClient._normalize_access_token(
             client.http.access_token)
         ws._emit = client.event_handler.emit
+        ws._send_limits = client._send_limits
+        ws._scheduler = SendScheduler(ws._send_now, client._send_limits,
+                                      loop=client.loop)
+        ws._scheduler.start()
 
         log.info(f'websocket created. connected to {WebSocketClient.WSS_URL}')
 
@@ -72,13 +129,34 @@ class WebSocketClient(websockets.client.WebSocketClientProtocol):
         return ws
 
     async def close(self, code=1000, reason=''):
-        super().close(code=code, reason=reason)
+        self._stop_scheduler()
+        await super().close(code=code, reason=reason)
+
+    @property
+    def scheduler(self):
+        """
+        The :class:`SendScheduler` rate limiting the messages this
+        connection sends. Its ``metrics()`` report the queue depth and wait
+        times.
+        """
+        return self._scheduler
+
+    def _stop_scheduler(self):
+        if self._scheduler:
+            self._scheduler.stop(WebSocketConnectionClosed(
+                'the connection was closed before the message was sent'))
 
     # outgoing message management
 
     async def send(self, data):
-        # TODO: Implement message 'rate-limiting' here, as specified
-        #  in https://dev.twitch.tv/docs/irc/guide#command--message-limits
+        # messages are rate limited as specified in
+        # https://dev.twitch.tv/docs/irc/guide#command--message-limits
+        if self._scheduler:
+            await self._scheduler.enqueue(data)
+        else:
+            await self._send_now(data)
+
+    async def _send_now(self, data):
         await super().send(data)
         self._emit(Event.SOCKET_SEND, data)
 
@@ -96,6 +174,32 @@ class WebSocketClient(websockets.client.WebSocketClientProtocol):
         await self.send(msg)
         self._emit(Event.PONGED)
 
+    async def heartbeat(self, timeout):
+        """
+        Sends a ``PING`` to the server and waits for its ``PONG``.
+
+        Returns the round trip time in seconds. Raises
+        :exc:`asyncio.TimeoutError` if no ``PONG`` arrived in time.
+        """
+        self._ping_count += 1
+        token = str(self._ping_count)
+        loop = self.loop
+        waiter = loop.create_future()
+        self._pong_waiters[token] = waiter
+        try:
+            await self.send(f'{OpCode.PING} :{token}')
+            sent_at = loop.time()
+            received_at = await asyncio.wait_for(waiter, timeout=timeout,
+                                                 loop=loop)
+        finally:
+            self._pong_waiters.pop(token, None)
+        return received_at - sent_at
+
+    def _on_pong(self, token):
+        waiter = self._pong_waiters.get(token)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(self.loop.time())
+
     async def send_join(self, channel_name):
         channel_name = channel_name if channel_name.startswith(
             CHANNEL_PREFIX) else CHANNEL_PREFIX + channel_name
@@ -103,6 +207,42 @@ class WebSocketClient(websockets.client.WebSocketClientProtocol):
         msg = f'{OpCode.JOIN} {channel_name}'
         await self.send(msg)
 
+    async def send_join_many(self, channel_names):
+        """
+        Joins the channels with as few ``JOIN #a,#b,...`` lines as
+        possible. Each line counts as one join per channel towards the join
+        limit, so the scheduler still paces them.
+        """
+        await self._send_batched(OpCode.JOIN, channel_names)
+
+    async def send_part_many(self, channel_names):
+        await self._send_batched(OpCode.PART, channel_names)
+
+    async def _send_batched(self, command, channel_names):
+        batch_size = WebSocketClient.JOIN_BATCH_SIZE
+        if self._send_limits is not None:
+            batch_size = min(batch_size, self._send_limits.join_limit)
+        lines = []
+        line = ''
+        count = 0
+        for channel_name in channel_names:
+            channel_name = CHANNEL_PREFIX + channel_name.lstrip(
+                CHANNEL_PREFIX).lower()
+            too_long = len(line) + len(channel_name) + 1 > \
+                WebSocketClient.MAX_LINE_LENGTH
+            if line and (too_long or count >= batch_size):
+                lines.append(line)
+                line = ''
+                count = 0
+            line = f'{line},{channel_name}' if line else \
+                f'{command} {channel_name}'
+            count += 1
+        if line:
+            lines.append(line)
+
+        for line in lines:
+            await self.send(line)
+
     async def send_message(self, channel_name, message):
         msg = f'{OpCode.PRIVMSG} {CHANNEL_PREFIX}{channel_name} :{message}'
         await self.send(msg)
@@ -118,10 +258,14 @@ class WebSocketClient(websockets.client.WebSocketClientProtocol):
     # incoming message management
 
     async def poll_event(self):
+        msg = await self.read_frame()
+        await self.receive(msg)
+
+    async def read_frame(self):
         try:
-            msg = await self.recv()
-            await self.receive(msg)
+            return await self.recv()
         except websockets.exceptions.ConnectionClosed as e:
+            self._stop_scheduler()
             raise WebSocketConnectionClosed(e)
 
     async def receive(self, msg):